@@ -13,4 +13,12 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ecommerce.settings")
 
+# Serve the read-heavy endpoints from their async views (see store.async_views)
+os.environ.setdefault("STORE_ASYNC_VIEWS", "1")
+
 application = get_asgi_application()
+
+# Build the in-memory category tree before the first request (see store.navigation)
+from store.navigation import warm_category_tree  # noqa: E402
+
+warm_category_tree()
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -42,6 +43,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "store.instrumentation.RequestStatsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -88,6 +90,18 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# The catalog cache version lives here, so production should point this at a
+# backend shared by every worker (Redis or Memcached).
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -124,7 +138,102 @@ USE_TZ = True
 
 STATIC_URL = "static/"
 
+# Uploaded product images and their generated variants
+
+MEDIA_URL = "media/"
+
+MEDIA_ROOT = BASE_DIR / "media"
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+
+# Store
+# Keyset pagination and streaming defaults for the catalog endpoints.
+
+STORE_PAGE_SIZE = 50
+
+STORE_MAX_PAGE_SIZE = 500
+
+STORE_STREAM_CHUNK_SIZE = 2000
+
+# Catalog cache: entry lifetime, and how long a rebuild may hold the single-flight
+# lock / how long other workers wait on it before building for themselves (seconds).
+
+STORE_CATALOG_CACHE_TIMEOUT = 300
+
+STORE_CATALOG_CACHE_LOCK_TIMEOUT = 10
+
+STORE_CATALOG_CACHE_LOCK_WAIT = 2
+
+# Upper bounds of the price bands reported in catalog facets; the last band is open-ended.
+
+STORE_PRICE_BANDS = [100, 500, 1000, 2500]
+
+# Largest number of operations accepted by one /cart/batch/ request.
+
+STORE_CART_BATCH_MAX_OPERATIONS = 200
+
+# Lifetime of the per-user cart payload cache; cart mutations invalidate it (seconds).
+
+STORE_CART_CACHE_TIMEOUT = 300
+
+# Route the read-heavy endpoints to store.async_views; ecommerce/asgi.py turns this on.
+
+STORE_ASYNC_VIEWS = os.environ.get("STORE_ASYNC_VIEWS") == "1"
+
+# Product image variants: longest side in pixels per variant, encoder quality per
+# format, and the size of the process pool rendering them (0 renders inline).
+
+STORE_IMAGE_VARIANTS = {"thumb": 160, "card": 480, "zoom": 1600}
+
+STORE_IMAGE_FORMATS = {"webp": 80, "jpeg": 85}
+
+STORE_IMAGE_WORKERS = 2
+
+# Request statistics: requests slower than this (ms) keep the SQL they run
+# past it, the newest STORE_STATS_SLOW_SAMPLES of them are retained, and a
+# file path in STORE_STATS_JSONL appends one JSON line per request.
+
+STORE_STATS_SLOW_REQUEST_MS = 500
+
+STORE_STATS_SLOW_SAMPLES = 50
+
+STORE_STATS_JSONL = None
+
+# Sessions live in the cache and reach the database write-behind: unchanged
+# sessions are not written, and each session's row is written at most once per
+# STORE_SESSION_WRITE_DELAY seconds (0 writes through on every change).
+
+SESSION_ENGINE = "store.sessions"
+
+STORE_SESSION_WRITE_DELAY = 5
+
+# Longest date range one sales analytics report may cover (days).
+
+STORE_ANALYTICS_MAX_DAYS = 366
+
+# Length of each product's "frequently bought together" list.
+
+STORE_RELATED_PRODUCTS = 10
+
+# Seconds a cart's stock reservation lasts before release_reservations returns
+# it to stock.
+
+STORE_RESERVATION_TTL = 900
+
+# Most product ids one /products/batch/ request may ask for.
+
+STORE_PRODUCT_BATCH_MAX = 100
+
+# Incremental order feeds only deliver orders at least this old (seconds), by
+# which time every checkout that created one has committed.
+
+STORE_ORDER_SETTLE_SECONDS = 300
+
+# Rows each sales rollup key is split over, so concurrent checkouts of one
+# product add to different rows; reports sum them.
+
+STORE_SALES_ROLLUP_SHARDS = 8
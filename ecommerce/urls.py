@@ -14,17 +14,25 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path
-from store import views
+from store import async_views, views
+
+# Under ASGI the read-heavy endpoints are served by their async variants
+read_views = async_views if settings.STORE_ASYNC_VIEWS else views
 
 urlpatterns = [
     
     path("admin/", admin.site.urls),
 
     # products URLs
-    path('products/', views.ProductListView.as_view(), name='product-list'),
-    path('products/<int:pk>/', views.ProductDetailView.as_view(), name='product-detail'),
+    path('products/', read_views.ProductListView.as_view(), name='product-list'),
+    path('products/<int:pk>/', read_views.ProductDetailView.as_view(), name='product-detail'),
+    path('products/batch/', views.ProductBatchView.as_view(), name='product-batch'),
+    path('products/<int:pk>/related/', read_views.ProductRelatedView.as_view(), name='product-related'),
+    path('categories/', read_views.CategoryTreeView.as_view(), name='category-tree'),
+    path('products/search/', views.ProductSearchView.as_view(), name='product-search'),
     path('products/create/', views.ProductCreateView.as_view(), name='product-create'),
     path('products/<int:pk>/update/', views.ProductUpdateView.as_view(), name='product-update'),
     path('products/<int:pk>/delete/', views.ProductDeleteView.as_view(), name='product-delete'),
@@ -38,15 +46,23 @@ urlpatterns = [
     path('password/change/', views.CustomPasswordChangeView.as_view(), name='password-change'),
     
     # cart URLs
-    path('cart/', views.CartDetailView.as_view(), name='cart-detail'),
+    path('cart/', read_views.CartDetailView.as_view(), name='cart-detail'),
     path('cart/add/<int:product_id>/', views.AddToCartView.as_view(), name='add-to-cart'),
     path('cart/remove/<int:product_id>/', views.RemoveFromCartView.as_view(), name='remove-from-cart'),
     path('cart/update/<int:product_id>/', views.UpdateCartItemView.as_view(), name='update-cart-item'),
+    path('cart/batch/', views.CartBatchView.as_view(), name='cart-batch'),
     
     # order URLs
     path('order/create/', views.OrderCreateView.as_view(), name='order-create'),
-    path('order/<int:order_id>/', views.OrderDetailView.as_view(), name='order-detail'),
-    path('order/history/', views.OrderHistoryView.as_view(), name='order-history'),
+    path('order/<int:order_id>/', read_views.OrderDetailView.as_view(), name='order-detail'),
+    path('order/history/', read_views.OrderHistoryView.as_view(), name='order-history'),
+    path('order/export/', views.OrderExportView.as_view(), name='order-export'),
+    
+    # stats URLs
+    path('stats/', views.RequestStatsView.as_view(), name='request-stats'),
+    
+    # analytics URLs
+    path('analytics/sales/', views.SalesAnalyticsView.as_view(), name='sales-analytics'),
     
     # payment URLs
     path('payment/initiate/', views.PaymentInitiateView.as_view(), name='payment-initiate'),
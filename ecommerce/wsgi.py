@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ecommerce.settings")
 
 application = get_wsgi_application()
+
+# Build the in-memory category tree before the first request (see store.navigation)
+from store.navigation import warm_category_tree  # noqa: E402
+
+warm_category_tree()
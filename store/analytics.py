@@ -0,0 +1,230 @@
+"""
+Sales rollups: units and revenue per day, subcategory and brand. Checkout
+adds to them in its own transaction, so reports read a few hundred rollup
+rows per month instead of scanning the order history.
+
+Each key is split over up to STORE_SALES_ROLLUP_SHARDS rows and a checkout
+adds to a random one, so checkouts of the same product lock different rows
+until they commit. Reports sum the shards; a rebuild folds them into one.
+"""
+import collections
+import datetime
+import functools
+import operator
+import random
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, Max, Min, Q, Sum, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .exports import settled_cutoff
+from .models import Order, OrderItem, SalesRollup
+
+# Report dimensions and the rollup columns behind them
+GROUP_FIELDS = {'day': 'day', 'subcategory': 'subcategory_id', 'brand': 'brand'}
+
+CENT = Decimal('0.01')
+
+
+class AnalyticsError(ValueError):
+    pass
+
+
+def sales_totals(lines):
+    """Sum ``(day, subcategory_id, brand, quantity, unit_price)`` lines per rollup key."""
+    totals = collections.defaultdict(lambda: [0, Decimal(0)])
+    for day, subcategory_id, brand, quantity, unit_price in lines:
+        total = totals[day, subcategory_id, brand]
+        total[0] += quantity
+        total[1] += unit_price * quantity
+    return totals
+
+
+def add_sales(totals, shard=0):
+    """
+    Add ``{(day, subcategory_id, brand): (units, revenue)}`` to the rollup
+    rows of ``shard`` in two statements whatever its size: insert the missing
+    rows at zero (a concurrent insert wins harmlessly), then increment them
+    all in one UPDATE.
+    """
+    if not totals:
+        return
+    keys = sorted(totals)
+    SalesRollup.objects.bulk_create(
+        [SalesRollup(day=day, subcategory_id=subcategory_id, brand=brand, shard=shard) for day, subcategory_id, brand in keys],
+        ignore_conflicts=True,
+    )
+    matches = [Q(day=day, subcategory_id=subcategory_id, brand=brand, shard=shard) for day, subcategory_id, brand in keys]
+    revenue_field = SalesRollup._meta.get_field('revenue')
+    SalesRollup.objects.filter(functools.reduce(operator.or_, matches)).update(
+        units=F('units') + Case(
+            *[When(match, then=Value(totals[key][0])) for match, key in zip(matches, keys)], default=Value(0),
+        ),
+        revenue=F('revenue') + Case(
+            *[When(match, then=Value(totals[key][1])) for match, key in zip(matches, keys)],
+            default=Value(Decimal(0)), output_field=revenue_field,
+        ),
+    )
+
+
+def record_order_sales(order, items):
+    """Add the lines of a new order to the rollups; call it inside the checkout transaction."""
+    day = timezone.localdate(order.created_at)
+    add_sales(sales_totals(
+        (day, item.product.subcategory_id, item.product.brand, item.quantity, item.unit_price) for item in items
+    ), random.randrange(settings.STORE_SALES_ROLLUP_SHARDS))
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time()))
+
+
+def _sales_lines(since, until):
+    lines = OrderItem.objects.all()
+    if since is not None:
+        lines = lines.filter(order__created_at__gte=_day_start(since))
+    if until is not None:
+        lines = lines.filter(order__created_at__lt=_day_start(until))
+    return lines
+
+
+def _scan_sales(lines, after, upto, chunk_size):
+    # One grouped query per window of chunk_size order ids keeps every statement bounded
+    totals = collections.defaultdict(lambda: [0, Decimal(0)])
+    start = after
+    while upto is None or start < upto:
+        window = lines.filter(order_id__gt=start)
+        if upto is not None:
+            window = window.filter(order_id__lte=min(start + chunk_size, upto))
+        rows = window.values(
+            rollup_day=TruncDate('order__created_at'),
+            rollup_subcategory=F('product__subcategory_id'),
+            rollup_brand=F('product__brand'),
+        ).annotate(units=Sum('quantity'), revenue=Sum(F('quantity') * F('unit_price'))).order_by()
+        for row in rows:
+            total = totals[row['rollup_day'], row['rollup_subcategory'], row['rollup_brand']]
+            total[0] += row['units']
+            total[1] += Decimal(row['revenue']).quantize(CENT)
+        if upto is None:
+            break
+        start += chunk_size
+    return totals
+
+
+def rebuild_sales_rollups(since=None, until=None, chunk_size=10000):
+    """
+    Recompute the rollups of the days in ``[since, until)``, or of every day,
+    from the order lines and replace them. Returns how many rows were written.
+
+    Lines are read ``chunk_size`` orders at a time and attributed to their
+    product's current subcategory and brand. Orders created within
+    STORE_ORDER_SETTLE_SECONDS of the start may still be committing, whatever
+    their id, and add themselves to the rows being replaced; they are read
+    inside the swap transaction instead, once every such checkout is in.
+    """
+    cutoff = settled_cutoff()
+    lines = _sales_lines(since, until)
+    bounds = Order.objects.aggregate(oldest=Min('id'), newest=Max('id'))
+    totals = _scan_sales(
+        lines.filter(order__created_at__lt=cutoff), (bounds['oldest'] or 1) - 1, bounds['newest'] or 0, chunk_size,
+    )
+
+    with transaction.atomic():
+        stale = SalesRollup.objects.all()
+        if since is not None:
+            stale = stale.filter(day__gte=since)
+        if until is not None:
+            stale = stale.filter(day__lt=until)
+        stale.delete()
+        for key, (units, revenue) in _scan_sales(lines.filter(order__created_at__gte=cutoff), 0, None, chunk_size).items():
+            totals[key][0] += units
+            totals[key][1] += revenue
+        SalesRollup.objects.bulk_create([
+            SalesRollup(day=day, subcategory_id=subcategory_id, brand=brand, units=units, revenue=revenue)
+            for (day, subcategory_id, brand), (units, revenue) in totals.items()
+        ], batch_size=1000)
+    return len(totals)
+
+
+def parse_day(value, name):
+    try:
+        day = parse_date(value)
+    except ValueError:
+        day = None
+    if day is None:
+        raise AnalyticsError(f'{name} must be an ISO date.')
+    return day
+
+
+def parse_report_params(params):
+    """
+    Read ``since`` and ``until`` (ISO dates, until exclusive; the last 30 days
+    by default), ``group_by`` (a comma list of day, subcategory and brand) and
+    the optional ``subcategory`` and ``brand`` filters.
+    """
+    until = parse_day(params['until'], 'until') if params.get('until') else timezone.localdate() + datetime.timedelta(days=1)
+    since = parse_day(params['since'], 'since') if params.get('since') else until - datetime.timedelta(days=30)
+    if since >= until:
+        raise AnalyticsError('since must be before until.')
+    if (until - since).days > settings.STORE_ANALYTICS_MAX_DAYS:
+        raise AnalyticsError(f'A report spans at most {settings.STORE_ANALYTICS_MAX_DAYS} days.')
+
+    group_by = [name for name in params.get('group_by', 'day').split(',') if name]
+    unknown = [name for name in group_by if name not in GROUP_FIELDS]
+    if unknown:
+        raise AnalyticsError(f"group_by accepts {', '.join(GROUP_FIELDS)}; got {', '.join(unknown)}.")
+
+    subcategory = params.get('subcategory')
+    if subcategory is not None and not subcategory.isdigit():
+        raise AnalyticsError('subcategory must be a subcategory id.')
+    return {
+        'since': since,
+        'until': until,
+        'group_by': list(dict.fromkeys(group_by)),
+        'subcategory': int(subcategory) if subcategory is not None else None,
+        'brand': params.get('brand'),
+    }
+
+
+def sales_report(since, until, group_by=('day',), subcategory=None, brand=None):
+    """Units and revenue in ``[since, until)``, overall and per ``group_by`` combination."""
+    rollups = SalesRollup.objects.filter(day__gte=since, day__lt=until)
+    if subcategory is not None:
+        rollups = rollups.filter(subcategory_id=subcategory)
+    if brand:
+        rollups = rollups.filter(brand=brand)
+
+    if not group_by:
+        totals = rollups.aggregate(total_units=Sum('units'), total_revenue=Sum('revenue'))
+        return _report(since, until, group_by, totals['total_units'] or 0, totals['total_revenue'] or 0, [])
+
+    fields = [GROUP_FIELDS[name] for name in group_by]
+    grouped = rollups.values(*fields).annotate(total_units=Sum('units'), total_revenue=Sum('revenue')).order_by(*fields)
+    rows = []
+    units, revenue = 0, Decimal(0)
+    for row in grouped:
+        entry = {name: row[GROUP_FIELDS[name]] for name in group_by}
+        if 'day' in entry:
+            entry['day'] = entry['day'].isoformat()
+        # The overall totals are summed here rather than by a second query
+        units += row['total_units']
+        revenue += Decimal(row['total_revenue']).quantize(CENT)
+        entry['units'] = row['total_units']
+        entry['revenue'] = str(Decimal(row['total_revenue']).quantize(CENT))
+        rows.append(entry)
+    return _report(since, until, group_by, units, revenue, rows)
+
+
+def _report(since, until, group_by, units, revenue, rows):
+    return {
+        'since': since.isoformat(),
+        'until': until.isoformat(),
+        'group_by': list(group_by),
+        'units': units,
+        'revenue': str(Decimal(revenue).quantize(CENT)),
+        'rows': rows,
+    }
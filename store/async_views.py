@@ -0,0 +1,156 @@
+"""
+Async variants of the read-heavy views, built on the async ORM so an ASGI
+worker serves them without a thread-pool hop per request. ecommerce/urls.py
+routes to them when STORE_ASYNC_VIEWS is on, which the ASGI entry point sets.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views import View
+
+from .cache import aget_cart_payload, aget_catalog_payload
+from .catalog import (
+    FilterError, aproduct_facets, filter_products, parse_product_filters, product_cache_key, product_list_cache_key,
+)
+from .exports import ExportError, parse_moment
+from .http import COLLECTION_VALIDATORS, ajson_array_stream, collection_etag, make_etag, not_modified, set_validators
+from .models import Order, Product
+from .navigation import acategory_tree_json
+from .pagination import (
+    PaginationError, aiterate_by_id, apaginate_by_id, apaginate_newest_first, parse_id_page, parse_newest_first_page,
+)
+from .recommendations import related_products, serialize_related
+from .serialization import (
+    LIST_IMAGE_VARIANTS, PRODUCT_DETAIL_FIELDS, PRODUCT_LIST_FIELDS, FieldsError, aserialize_products, cart_rows,
+    parse_product_fields, product_values, serialize_cart, serialize_order, serialize_product, user_orders,
+)
+
+
+async def _authenticated_user(request):
+    # request.user is loaded lazily from the session, which is synchronous in Django 4.2
+    return await sync_to_async(lambda: request.user if request.user.is_authenticated else None)()
+
+
+async def _collection_validators(queryset, request):
+    stats = await queryset.aaggregate(**COLLECTION_VALIDATORS)
+    return collection_etag(stats, request), stats['last_modified']
+
+
+###########################Product views######################
+class ProductListView(View):
+    async def get(self, request):
+        try:
+            filters = parse_product_filters(request.GET)
+            fields, expand = parse_product_fields(request.GET, PRODUCT_LIST_FIELDS)
+            cursor, page_size = (None, None) if request.GET.get('stream') else parse_id_page(request)
+        except (FilterError, FieldsError, PaginationError) as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+        etag, last_modified = await _collection_validators(Product.objects.all(), request)
+        response = not_modified(request, etag, last_modified)
+        if response is not None:
+            return response
+        response = await self.build_response(request, filters, fields, expand, cursor, page_size)
+        return set_validators(response, etag, last_modified)
+
+    async def build_response(self, request, filters, fields, expand, cursor, page_size):
+        # Only the requested columns are read, straight into dicts
+        products = filter_products(product_values(Product.objects.all(), fields, expand), filters)
+
+        # Full dump mode: stream the whole catalog with flat worker memory
+        if request.GET.get('stream'):
+            chunk_size = settings.STORE_STREAM_CHUNK_SIZE
+            rows = aserialize_products(aiterate_by_id(products, chunk_size), fields, expand, LIST_IMAGE_VARIANTS)
+            return StreamingHttpResponse(ajson_array_stream(rows, chunk_size), content_type='application/json')
+
+        async def build():
+            results, next_cursor = await apaginate_by_id(products, cursor, page_size)
+            results = [serialize_product(row, fields, expand, LIST_IMAGE_VARIANTS) for row in results]
+            data = {'results': results, 'next_cursor': next_cursor}
+            if not cursor:
+                data['facets'] = await aproduct_facets(filters)
+            return data
+
+        data = await aget_catalog_payload(product_list_cache_key(request.GET, cursor, page_size, fields, expand), build)
+        return JsonResponse(data)
+
+class ProductDetailView(View):
+    async def get(self, request, pk):
+        try:
+            fields, expand = parse_product_fields(request.GET, PRODUCT_DETAIL_FIELDS)
+        except FieldsError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        last_modified = await Product.objects.filter(pk=pk).values_list('updated_at', flat=True).afirst()
+        etag = make_etag(pk, last_modified, *fields, *expand)
+        if last_modified is not None:
+            response = not_modified(request, etag, last_modified)
+            if response is not None:
+                return response
+
+        async def build():
+            try:
+                row = await product_values(Product.objects.all(), fields, expand).aget(pk=pk)
+            except Product.DoesNotExist:
+                raise Http404('No Product matches the given query.')
+            return serialize_product(row, fields, expand)
+
+        data = await aget_catalog_payload(product_cache_key(pk, fields, expand), build)
+        return set_validators(JsonResponse(data), etag, last_modified)
+
+class ProductRelatedView(View):
+    async def get(self, request, pk):
+        rows = [row async for row in related_products(pk)]
+        return JsonResponse({'product_id': pk, 'results': serialize_related(rows)})
+
+class CategoryTreeView(View):
+    async def get(self, request):
+        return HttpResponse(await acategory_tree_json(), content_type='application/json')
+
+
+###########################Cart views######################
+class CartDetailView(View):
+    async def get(self, request):
+        user = await _authenticated_user(request)
+        if user is None:
+            return redirect_to_login(request.get_full_path())
+
+        async def build():
+            return serialize_cart([row async for row in cart_rows(user)])
+
+        return JsonResponse(await aget_cart_payload(user.id, build))
+
+
+###########################Order views######################
+class OrderDetailView(View):
+    async def get(self, request, order_id):
+        user = await _authenticated_user(request)
+        if user is None:
+            return redirect_to_login(request.get_full_path())
+
+        try:
+            order = await user_orders(user).aget(id=order_id)
+        except Order.DoesNotExist:
+            raise Http404('No Order matches the given query.')
+        return JsonResponse(serialize_order(order))
+
+class OrderHistoryView(View):
+    async def get(self, request):
+        user = await _authenticated_user(request)
+        if user is None:
+            return redirect_to_login(request.get_full_path())
+
+        try:
+            since, until = parse_moment(request.GET.get('since'), 'since'), parse_moment(request.GET.get('until'), 'until')
+            cursor, page_size = parse_newest_first_page(request)
+        except (ExportError, PaginationError) as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+        etag, last_modified = await _collection_validators(Order.objects.filter(user=user), request)
+        response = not_modified(request, etag, last_modified)
+        if response is not None:
+            return response
+
+        orders, next_cursor = await apaginate_newest_first(user_orders(user, since, until), cursor, page_size)
+        data = {'results': [serialize_order(order) for order in orders], 'next_cursor': next_cursor}
+        return set_validators(JsonResponse(data), etag, last_modified)
@@ -0,0 +1,193 @@
+import contextlib
+import random
+import types
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Max
+from django.urls import path
+
+from .models import Cart, CartItem, Category, Order, OrderItem, Product, Subcategory
+from .search import index_products
+
+BRANDS = [
+    'Fender', 'Gibson', 'Yamaha', 'Roland', 'Korg', 'Ibanez', 'Martin', 'Taylor', 'Steinway', 'Kawai',
+    'Stentor', 'Moog', 'Nord', 'Casio', 'Epiphone', 'Gretsch', 'Rickenbacker', 'Squier', 'Cremona', 'Arturia',
+]
+ADJECTIVES = [
+    'vintage', 'classic', 'deluxe', 'studio', 'standard', 'custom', 'professional', 'student', 'signature',
+    'limited', 'hollow', 'solid', 'compact', 'concert', 'stage', 'travel', 'analog', 'digital', 'modular', 'electro',
+]
+MODELS = [
+    'stratocaster', 'telecaster', 'jazzmaster', 'precision', 'explorer', 'flying', 'dreadnought', 'parlor',
+    'jumbo', 'cutaway', 'upright', 'grand', 'baby', 'fretless', 'sequencer', 'workstation', 'polysynth',
+    'monosynth', 'viola', 'cello', 'fiddle', 'archtop', 'resonator', 'baritone', 'headless',
+]
+WORDS = [
+    'maple', 'rosewood', 'ebony', 'mahogany', 'spruce', 'alder', 'ash', 'walnut', 'humbucker', 'single',
+    'coil', 'tremolo', 'bridge', 'neck', 'fretboard', 'pickup', 'tuners', 'strings', 'case', 'finish',
+    'sunburst', 'black', 'white', 'natural', 'gloss', 'satin', 'keys', 'weighted', 'hammer', 'action',
+    'oscillator', 'filter', 'envelope', 'arpeggiator', 'patch', 'memory', 'bow', 'rosin', 'chinrest', 'tone',
+]
+
+
+@contextlib.contextmanager
+def isolated_database(verbosity=0):
+    """
+    Run the body against a freshly migrated copy of the test database, the
+    same one the test runner would create, and drop it afterwards.
+    """
+    old_name = connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))]
+
+
+def summarize(latencies):
+    # Latencies come in seconds and are reported in milliseconds
+    return {
+        'count': len(latencies),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'max_ms': round(max(latencies, default=0) * 1000, 3),
+    }
+
+
+def seed_subcategories():
+    subcategories = []
+    for category_name, _ in Category.CATEGORY_CHOICES:
+        category = Category.objects.create(name=category_name)
+        for subcategory_name, _ in Subcategory.SUBCATEGORY_CHOICES:
+            subcategories.append(Subcategory.objects.create(name=subcategory_name, category=category))
+    return subcategories
+
+
+def generate_products(count, subcategories, seed=0):
+    """Yield ``count`` unsaved, deterministic products spread over ``subcategories``."""
+    rng = random.Random(seed)
+    for index in range(count):
+        brand = rng.choice(BRANDS)
+        name = f'{brand} {rng.choice(ADJECTIVES)} {rng.choice(MODELS)} {index}'
+        yield Product(
+            name=name,
+            subcategory=rng.choice(subcategories),
+            description=' '.join(rng.choices(WORDS, k=rng.randint(8, 24))),
+            price=f'{rng.randint(50, 500000) / 100:.2f}',
+            image='',
+            brand=brand,
+            slug=f'product-{index}',
+        )
+
+
+def seed_products(count, subcategories, seed=0, batch_size=5000):
+    # bulk_create skips the Product signals, so index each batch explicitly
+    batch = []
+    for product in generate_products(count, subcategories, seed):
+        batch.append(product)
+        if len(batch) == batch_size:
+            _write_products(batch)
+            batch = []
+    if batch:
+        _write_products(batch)
+
+
+def _write_products(batch):
+    with transaction.atomic():
+        index_products(Product.objects.bulk_create(batch))
+
+
+def seed_shopper(username, products, orders=20, seed=0):
+    """Create a user with a filled cart and an order history over ``products``."""
+    rng = random.Random(seed)
+    user = User.objects.create_user(username=username, password='benchmark')
+    cart = Cart.objects.create(user=user)
+    CartItem.objects.bulk_create([
+        CartItem(cart=cart, product=product, quantity=rng.randint(1, 3)) for product in rng.sample(products, 5)
+    ])
+    for _ in range(orders):
+        lines = [(product, rng.randint(1, 3)) for product in rng.sample(products, 3)]
+        total = sum(product.price * quantity for product, quantity in lines)
+        order = Order.objects.create(user=user, subtotal=total, total=total)
+        OrderItem.objects.bulk_create([
+            OrderItem(order=order, product=product, quantity=quantity, unit_price=product.price)
+            for product, quantity in lines
+        ])
+    return user
+
+
+def seed_users(count, password='benchmark', batch_size=5000):
+    """Create ``count`` users named user0, user1, ... and return their ids in that order."""
+    # Hashing is slow on purpose, so every generated user shares one hash
+    hashed = make_password(password)
+    for start in range(0, count, batch_size):
+        User.objects.bulk_create([
+            User(username=f'user{index}', password=hashed) for index in range(start, min(start + batch_size, count))
+        ])
+    return list(User.objects.filter(username__startswith='user').order_by('id').values_list('id', flat=True))
+
+
+def seed_orders(count, user_ids, seed=0, max_items=4, batch_size=5000):
+    """
+    Create ``count`` deterministic orders spread over ``user_ids``, each with
+    one to ``max_items`` lines priced from the catalog. Returns the number of lines.
+    """
+    rng = random.Random(seed)
+    products = list(Product.objects.order_by('id').values_list('id', 'price'))
+    # Explicit ids let order lines point at their order without reading ids back
+    next_id = (Order.objects.aggregate(Max('id'))['id__max'] or 0) + 1
+    orders, items, lines = [], [], 0
+    for order_id in range(next_id, next_id + count):
+        total = 0
+        for product_id, price in rng.sample(products, rng.randint(1, min(max_items, len(products)))):
+            quantity = rng.randint(1, 3)
+            total += price * quantity
+            items.append(OrderItem(order_id=order_id, product_id=product_id, quantity=quantity, unit_price=price))
+        orders.append(Order(id=order_id, user_id=rng.choice(user_ids), subtotal=total, total=total))
+        if len(orders) == batch_size:
+            lines += _write_orders(orders, items)
+            orders, items = [], []
+    if orders:
+        lines += _write_orders(orders, items)
+    return lines
+
+
+def _write_orders(orders, items):
+    with transaction.atomic():
+        Order.objects.bulk_create(orders)
+        OrderItem.objects.bulk_create(items)
+    return len(items)
+
+
+def read_urlconf(read_views):
+    """A URLconf routing the read-heavy endpoints to ``read_views`` (sync or async)."""
+    urlconf = types.ModuleType(f'{read_views.__name__}_bench_urls')
+    urlconf.urlpatterns = [
+        path('products/', read_views.ProductListView.as_view(), name='product-list'),
+        path('products/<int:pk>/', read_views.ProductDetailView.as_view(), name='product-detail'),
+        path('cart/', read_views.CartDetailView.as_view(), name='cart-detail'),
+        path('order/<int:order_id>/', read_views.OrderDetailView.as_view(), name='order-detail'),
+        path('order/history/', read_views.OrderHistoryView.as_view(), name='order-history'),
+    ]
+    return urlconf
+
+
+def sample_queries(count, seed=0):
+    rng = random.Random(seed)
+    shapes = [
+        lambda: rng.choice(MODELS),
+        lambda: f'{rng.choice(BRANDS)} {rng.choice(MODELS)}',
+        lambda: f'{rng.choice(ADJECTIVES)} {rng.choice(WORDS)}',
+        lambda: f'{rng.choice(BRANDS)} {rng.choice(ADJECTIVES)} {rng.choice(MODELS)}',
+        lambda: rng.choice(MODELS)[:4],
+    ]
+    return [rng.choice(shapes)() for _ in range(count)]
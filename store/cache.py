@@ -0,0 +1,166 @@
+import asyncio
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+CATALOG_VERSION_KEY = 'catalog:version'
+
+_stats = {'hits': 0, 'misses': 0}
+_stats_lock = threading.Lock()
+
+
+def _record(outcome):
+    with _stats_lock:
+        _stats[outcome] += 1
+
+
+def catalog_cache_stats():
+    with _stats_lock:
+        return dict(_stats)
+
+
+def get_version(key):
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock so an evicted version never reuses an old number
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+async def aget_version(key):
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, time.time_ns(), timeout=None)
+        version = await cache.aget(key)
+    return version
+
+
+def bump_version(key):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        get_version(key)
+        return cache.incr(key)
+
+
+def get_catalog_version():
+    return get_version(CATALOG_VERSION_KEY)
+
+
+async def aget_catalog_version():
+    return await aget_version(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version():
+    return bump_version(CATALOG_VERSION_KEY)
+
+
+def get_catalog_payload(name, build):
+    """
+    Return the cached payload stored under ``name`` for the current catalog
+    version, calling ``build()`` to produce it on a miss.
+
+    Only one caller per key rebuilds at a time; the others wait for its
+    result instead of all querying the database for the same cold key.
+    """
+    key = f'catalog:{get_catalog_version()}:{name}'
+    payload = cache.get(key)
+    if payload is not None:
+        _record('hits')
+        return payload
+
+    _record('misses')
+    lock_key = f'{key}:lock'
+    if cache.add(lock_key, 1, timeout=settings.STORE_CATALOG_CACHE_LOCK_TIMEOUT):
+        try:
+            payload = build()
+            cache.set(key, payload, timeout=settings.STORE_CATALOG_CACHE_TIMEOUT)
+        finally:
+            cache.delete(lock_key)
+        return payload
+
+    # Another worker is building this entry: wait for it, then give up and build locally
+    deadline = time.monotonic() + settings.STORE_CATALOG_CACHE_LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(0.02)
+        payload = cache.get(key)
+        if payload is not None:
+            return payload
+    return build()
+
+
+async def aget_catalog_payload(name, build):
+    """Async twin of get_catalog_payload; ``build`` is a coroutine function."""
+    key = f'catalog:{await aget_catalog_version()}:{name}'
+    payload = await cache.aget(key)
+    if payload is not None:
+        _record('hits')
+        return payload
+
+    _record('misses')
+    lock_key = f'{key}:lock'
+    if await cache.aadd(lock_key, 1, timeout=settings.STORE_CATALOG_CACHE_LOCK_TIMEOUT):
+        try:
+            payload = await build()
+            await cache.aset(key, payload, timeout=settings.STORE_CATALOG_CACHE_TIMEOUT)
+        finally:
+            await cache.adelete(lock_key)
+        return payload
+
+    deadline = time.monotonic() + settings.STORE_CATALOG_CACHE_LOCK_WAIT
+    while time.monotonic() < deadline:
+        await asyncio.sleep(0.02)
+        payload = await cache.aget(key)
+        if payload is not None:
+            return payload
+    return await build()
+
+
+def get_catalog_payloads(names, build):
+    """
+    Multi-key get_catalog_payload: the cached payloads of ``names`` come back
+    from one cache round trip, and ``build(missing)`` returns ``{name: payload}``
+    for all the misses at once. Names it leaves out are left out of the result.
+    """
+    # Misses are built without the per-key lock: a batch rarely races another for the same keys
+    prefix = f'catalog:{get_catalog_version()}:'
+    found = cache.get_many([prefix + name for name in names])
+    payloads = {key[len(prefix):]: payload for key, payload in found.items()}
+    missing = [name for name in names if name not in payloads]
+    with _stats_lock:
+        _stats['hits'] += len(payloads)
+        _stats['misses'] += len(missing)
+    if missing:
+        built = build(missing)
+        cache.set_many({prefix + name: payload for name, payload in built.items()}, timeout=settings.STORE_CATALOG_CACHE_TIMEOUT)
+        payloads.update(built)
+    return payloads
+
+
+def _cart_key(user_id):
+    # Carts embed product prices, so catalog changes retire them too
+    return f'cart:{get_catalog_version()}:{user_id}'
+
+
+def get_cart_payload(user_id, build):
+    payload = cache.get(_cart_key(user_id))
+    if payload is None:
+        payload = build()
+        cache.set(_cart_key(user_id), payload, timeout=settings.STORE_CART_CACHE_TIMEOUT)
+    return payload
+
+
+async def aget_cart_payload(user_id, build):
+    key = f'cart:{await aget_catalog_version()}:{user_id}'
+    payload = await cache.aget(key)
+    if payload is None:
+        payload = await build()
+        await cache.aset(key, payload, timeout=settings.STORE_CART_CACHE_TIMEOUT)
+    return payload
+
+
+def invalidate_cart(user_id):
+    cache.delete(_cart_key(user_id))
@@ -0,0 +1,141 @@
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db.models import Case, Count, IntegerField, Q, Value, When
+
+from .http import cache_key
+from .models import Product
+from .serialization import PRODUCT_DETAIL_FIELDS
+
+
+PRODUCT_FILTER_PARAMS = ('category', 'subcategory', 'brand', 'min_price', 'max_price')
+
+
+class FilterError(ValueError):
+    pass
+
+
+def _parse_id(params, name):
+    value = params.get(name)
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise FilterError(f'{name} must be an integer id.')
+
+
+def _parse_price(params, name):
+    value = params.get(name)
+    if value is None:
+        return None
+    try:
+        price = Decimal(value)
+    except InvalidOperation:
+        raise FilterError(f'{name} must be a number.')
+    if not price.is_finite():
+        raise FilterError(f'{name} must be a number.')
+    return price
+
+
+def parse_product_filters(params):
+    """
+    Turn the catalog query parameters into one Q object per facet dimension,
+    so each facet can be counted with every filter except its own applied.
+    """
+    filters = {}
+    category = _parse_id(params, 'category')
+    if category is not None:
+        filters['category'] = Q(subcategory__category_id=category)
+    subcategory = _parse_id(params, 'subcategory')
+    if subcategory is not None:
+        filters['subcategory'] = Q(subcategory_id=subcategory)
+    if params.get('brand'):
+        filters['brand'] = Q(brand=params['brand'])
+
+    min_price = _parse_price(params, 'min_price')
+    max_price = _parse_price(params, 'max_price')
+    if min_price is not None or max_price is not None:
+        price = Q()
+        if min_price is not None:
+            price &= Q(price__gte=min_price)
+        if max_price is not None:
+            price &= Q(price__lte=max_price)
+        filters['price'] = price
+    return filters
+
+
+def filter_products(queryset, filters, exclude=None):
+    for dimension, condition in filters.items():
+        if dimension != exclude:
+            queryset = queryset.filter(condition)
+    return queryset
+
+
+def _price_band_case():
+    # Band i covers [bounds[i - 1], bounds[i]); the last band is open-ended
+    bounds = settings.STORE_PRICE_BANDS
+    return Case(
+        *[When(price__lt=bound, then=Value(index)) for index, bound in enumerate(bounds)],
+        default=Value(len(bounds)),
+        output_field=IntegerField(),
+    )
+
+
+def product_list_cache_key(params, cursor, page_size, fields, expand):
+    return cache_key('products', cursor, page_size, fields, expand, *[params.get(name) for name in PRODUCT_FILTER_PARAMS])
+
+
+def product_cache_key(pk, fields, expand):
+    # Sparse fieldsets are cached apart from the full detail payload
+    if (fields, expand) == (PRODUCT_DETAIL_FIELDS, ()):
+        return f'product:{pk}'
+    return cache_key(f'product:{pk}', fields, expand)
+
+
+def _facet_querysets(filters):
+    products = Product.objects.order_by()
+    subcategories = (
+        filter_products(products, filters, exclude='subcategory')
+        .values('subcategory_id', 'subcategory__name')
+        .annotate(count=Count('id'))
+        .order_by('subcategory_id')
+    )
+    brands = (
+        filter_products(products, filters, exclude='brand')
+        .values('brand')
+        .annotate(count=Count('id'))
+        .order_by('brand')
+    )
+    bands = (
+        filter_products(products, filters, exclude='price')
+        .annotate(band=_price_band_case())
+        .values('band')
+        .annotate(count=Count('id'))
+        .order_by('band')
+    )
+    return subcategories, brands, bands
+
+
+def _format_facets(subcategories, brands, bands):
+    bounds = [0, *settings.STORE_PRICE_BANDS, None]
+    return {
+        'subcategory': [
+            {'id': row['subcategory_id'], 'name': row['subcategory__name'], 'count': row['count']}
+            for row in subcategories
+        ],
+        'brand': [{'brand': row['brand'], 'count': row['count']} for row in brands],
+        'price': [
+            {'min': bounds[row['band']], 'max': bounds[row['band'] + 1], 'count': row['count']}
+            for row in bands
+        ],
+    }
+
+
+def product_facets(filters):
+    """Count matching products per subcategory, brand and price band with grouped queries."""
+    return _format_facets(*[list(queryset) for queryset in _facet_querysets(filters)])
+
+
+async def aproduct_facets(filters):
+    return _format_facets(*[[row async for row in queryset] for queryset in _facet_querysets(filters)])
@@ -0,0 +1,66 @@
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.crypto import md5
+from django.utils.http import http_date, quote_etag
+
+# Aggregates whose result changes whenever any row of a collection changes
+COLLECTION_VALIDATORS = {'last_modified': Max('updated_at'), 'count': Count('id')}
+
+
+def json_array_stream(rows, chunk_size):
+    # Encode rows incrementally so the full array never exists in memory
+    encoder = DjangoJSONEncoder()
+    yield '['
+    buffer = []
+    for index, row in enumerate(rows):
+        buffer.append(('' if index == 0 else ',') + encoder.encode(row))
+        if len(buffer) >= chunk_size:
+            yield ''.join(buffer)
+            buffer = []
+    yield ''.join(buffer) + ']'
+
+
+async def ajson_array_stream(rows, chunk_size):
+    encoder = DjangoJSONEncoder()
+    yield '['
+    buffer = []
+    index = 0
+    async for row in rows:
+        buffer.append(('' if index == 0 else ',') + encoder.encode(row))
+        index += 1
+        if len(buffer) >= chunk_size:
+            yield ''.join(buffer)
+            buffer = []
+    yield ''.join(buffer) + ']'
+
+
+def cache_key(prefix, *parts):
+    # Hash free-form parameters so keys stay short and safe for any cache backend
+    return '%s:%s' % (prefix, md5(repr(parts).encode(), usedforsecurity=False).hexdigest())
+
+
+def make_etag(*parts):
+    return quote_etag(md5(':'.join(str(part) for part in parts).encode(), usedforsecurity=False).hexdigest())
+
+
+def collection_etag(stats, request):
+    # ``stats`` holds the COLLECTION_VALIDATORS aggregates; the query string
+    # is part of the tag because it selects what the payload contains
+    return make_etag(stats['last_modified'], stats['count'], sorted(request.GET.lists()))
+
+
+def not_modified(request, etag, last_modified):
+    # Returns a 304 response when the client's validators still match, else None
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    return get_conditional_response(request, etag=etag, last_modified=timestamp)
+
+
+def set_validators(response, etag, last_modified):
+    # Only a successful response is a representation a client may revalidate
+    if response.status_code != 200:
+        return response
+    response.headers['ETag'] = etag
+    if last_modified:
+        response.headers['Last-Modified'] = http_date(last_modified.timestamp())
+    return response
@@ -0,0 +1,125 @@
+import hashlib
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections
+from django.utils import timezone
+from PIL import UnidentifiedImageError
+
+from .cache import bump_catalog_version
+from .imaging import FORMATS, render_variants
+from .models import Product
+
+logger = logging.getLogger(__name__)
+
+VARIANT_DIR = 'product_images/variants'
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _pool(kind):
+    # One process pool renders, one thread feeds it, both started on first use
+    with _pools_lock:
+        if kind not in _pools:
+            if kind == 'render':
+                _pools[kind] = ProcessPoolExecutor(max_workers=settings.STORE_IMAGE_WORKERS)
+            else:
+                _pools[kind] = ThreadPoolExecutor(max_workers=1, thread_name_prefix='product-images')
+        return _pools[kind]
+
+
+def needs_variants(product):
+    return product.image_variants.get('source', '') != product.image.name
+
+
+def store_variants(rendered):
+    """
+    Save rendered variants under names derived from their content, so a URL
+    always serves the same bytes and can be cached forever.
+    """
+    files = {}
+    for variant, encoded in rendered.items():
+        files[variant] = {}
+        for fmt, data in encoded.items():
+            name = f'{VARIANT_DIR}/{hashlib.sha256(data).hexdigest()[:32]}.{FORMATS[fmt][1]}'
+            if not default_storage.exists(name):
+                name = default_storage.save(name, ContentFile(data))
+            files[variant][fmt] = name
+    return files
+
+
+def _render(source, executor):
+    args = (source, settings.STORE_IMAGE_VARIANTS, settings.STORE_IMAGE_FORMATS)
+    if executor is None:
+        return render_variants(*args)
+    return executor.submit(render_variants, *args)
+
+
+def build_product_images(products, executor=None):
+    """
+    Render, store and record the variants of ``products``; with an
+    ``executor`` the renders run in parallel on it. Returns how many products
+    were updated.
+    """
+    jobs = []
+    for product in products:
+        if not product.image.name:
+            jobs.append((product, None))
+            continue
+        try:
+            with default_storage.open(product.image.name) as source:
+                jobs.append((product, _render(source.read(), executor)))
+        except (OSError, UnidentifiedImageError) as e:
+            logger.warning('Skipping image of product %s: %s', product.pk, e)
+
+    updated = 0
+    for product, job in jobs:
+        variants = {}
+        if job is not None:
+            try:
+                rendered = job.result() if executor is not None else job
+            except (OSError, UnidentifiedImageError) as e:
+                logger.warning('Skipping image of product %s: %s', product.pk, e)
+                continue
+            variants = {'source': product.image.name, 'files': store_variants(rendered)}
+        # update() skips the save signals; matching on the image leaves a newer upload alone
+        updated += Product.objects.filter(pk=product.pk, image=product.image.name).update(
+            image_variants=variants, updated_at=timezone.now(),
+        )
+    if updated:
+        bump_catalog_version()
+    return updated
+
+
+def _build_in_background(product_ids):
+    try:
+        products = Product.objects.filter(pk__in=product_ids).only('id', 'image', 'image_variants')
+        build_product_images([product for product in products if needs_variants(product)], _pool('render'))
+    except Exception:
+        logger.exception('Building images for products %s failed', product_ids)
+    finally:
+        close_old_connections()
+
+
+def schedule_product_images(product_ids):
+    """Build variants off the request path, or inline when STORE_IMAGE_WORKERS is 0."""
+    if not settings.STORE_IMAGE_WORKERS:
+        products = Product.objects.filter(pk__in=product_ids).only('id', 'image', 'image_variants')
+        build_product_images([product for product in products if needs_variants(product)])
+        return
+    _pool('dispatch').submit(_build_in_background, list(product_ids))
+
+
+def image_urls(variants, names=None):
+    """Map ``{variant: {format: url}}`` from a product's ``image_variants``."""
+    files = (variants or {}).get('files', {})
+    return {
+        name: {fmt: default_storage.url(path) for fmt, path in formats.items()}
+        for name, formats in files.items()
+        if names is None or name in names
+    }
@@ -0,0 +1,48 @@
+"""
+Pillow-only image rendering. Nothing here touches Django, so process pool
+workers can import it under any multiprocessing start method.
+"""
+import io
+
+from PIL import Image, ImageOps
+
+# Pillow format names and file extensions of the output formats
+FORMATS = {'webp': ('WEBP', 'webp'), 'jpeg': ('JPEG', 'jpg')}
+
+
+def _normalize(image):
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ('RGB', 'RGBA'):
+        return image
+    has_alpha = image.mode in ('LA', 'PA') or 'transparency' in image.info
+    return image.convert('RGBA' if has_alpha else 'RGB')
+
+
+def _encode(image, fmt, quality):
+    if fmt == 'jpeg' and image.mode == 'RGBA':
+        # JPEG has no alpha channel: flatten onto white
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    buffer = io.BytesIO()
+    image.save(buffer, format=FORMATS[fmt][0], quality=quality, optimize=fmt == 'jpeg')
+    return buffer.getvalue()
+
+
+def render_variants(source, variants, formats):
+    """
+    Resize the encoded image ``source`` to fit each ``{variant: longest side}``
+    box (never upscaling) and encode it in each ``{format: quality}``.
+
+    Returns ``{variant: {format: bytes}}``.
+    """
+    with Image.open(io.BytesIO(source)) as original:
+        image = _normalize(original)
+        image.load()
+
+    rendered = {}
+    for variant, size in variants.items():
+        resized = image.copy()
+        resized.thumbnail((size, size), Image.LANCZOS)
+        rendered[variant] = {fmt: _encode(resized, fmt, quality) for fmt, quality in formats.items()}
+    return rendered
@@ -0,0 +1,180 @@
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils.text import slugify
+
+from .cache import bump_catalog_version
+from .models import Product, Subcategory
+from .navigation import bump_tree_version
+from .search import index_products
+
+IMPORT_FORMATS = ('csv', 'jsonl')
+
+SLUG_MAX_LENGTH = Product._meta.get_field('slug').max_length
+
+# Prices beyond the column's digits would fail the whole batch's insert
+PRICE_LIMIT = Decimal(10) ** (Product._meta.get_field('price').max_digits - Product._meta.get_field('price').decimal_places)
+
+
+class ImportRowError(ValueError):
+    pass
+
+
+def read_rows(stream, fmt):
+    """Yield one dict per input record without reading the whole stream."""
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+        return
+    for line in stream:
+        if line.strip():
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            # Surface bad lines as bad rows so the line numbering stays aligned
+            yield row if isinstance(row, dict) else {}
+
+
+def subcategory_map():
+    """
+    Map every way a feed may name a subcategory, its id or
+    ``category/subcategory``, to the subcategory id.
+    """
+    lookup = {}
+    for row in Subcategory.objects.values('id', 'name', 'category__name'):
+        lookup[str(row['id'])] = row['id']
+        lookup[f"{row['category__name']}/{row['name']}"] = row['id']
+    return lookup
+
+
+def _text(row, field):
+    # JSON lines may carry any type; checked here so one bad row cannot abort a batch insert
+    value = row.get(field)
+    if value is None:
+        return ''
+    if not isinstance(value, str):
+        raise ImportRowError(f'{field} must be a string.')
+    value = value.strip()
+    max_length = Product._meta.get_field(field).max_length
+    if max_length is not None and len(value) > max_length:
+        raise ImportRowError(f'{field} must be at most {max_length} characters.')
+    return value
+
+
+def parse_row(row, subcategories):
+    name = _text(row, 'name')
+    if not name:
+        raise ImportRowError('name is required.')
+    if not slugify(name):
+        raise ImportRowError('name must contain a letter or digit.')
+
+    subcategory_id = subcategories.get(str(row.get('subcategory') or '').strip().lower())
+    if subcategory_id is None:
+        raise ImportRowError(f"unknown subcategory {row.get('subcategory')!r}.")
+
+    try:
+        price = Decimal(str(row.get('price')).strip()).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        raise ImportRowError('price must be a number.')
+    if not price.is_finite() or price < 0:
+        raise ImportRowError('price must be a non-negative number.')
+    if price >= PRICE_LIMIT:
+        raise ImportRowError(f'price must be below {PRICE_LIMIT}.')
+
+    return Product(
+        name=name,
+        subcategory_id=subcategory_id,
+        description=_text(row, 'description'),
+        price=price,
+        image=_text(row, 'image'),
+        brand=_text(row, 'brand'),
+    )
+
+
+def _stem(slug):
+    # Leave room for a "-<n>" suffix inside the column
+    return slug[:SLUG_MAX_LENGTH - 8]
+
+
+def _slug_candidates(base, start, count):
+    for suffix in range(start, start + count):
+        yield base if suffix == 1 else f'{_stem(base)}-{suffix}'
+
+
+def assign_slugs(products):
+    """
+    Give each product a unique slug, matching Product.save when there is no clash.
+
+    Every round checks one window of candidates per name with a single
+    ``slug__in`` query; a clean batch needs one round, and names that keep
+    clashing double their window each round.
+    """
+    groups = {}
+    for product in products:
+        groups.setdefault(slugify(product.name)[:SLUG_MAX_LENGTH], []).append(product)
+    # Next suffix to try per base; 1 stands for the bare base
+    next_suffix = dict.fromkeys(groups, 1)
+    claimed = set()
+    window = 1
+    while groups:
+        candidates = {
+            base: list(_slug_candidates(base, next_suffix[base], len(group) * window))
+            for base, group in groups.items()
+        }
+        taken = set(
+            Product.objects.filter(slug__in=[slug for slugs in candidates.values() for slug in slugs])
+            .values_list('slug', flat=True)
+        )
+        for base, slugs in candidates.items():
+            group = groups[base]
+            for slug in slugs:
+                if not group:
+                    break
+                if slug not in taken and slug not in claimed:
+                    claimed.add(slug)
+                    group.pop(0).slug = slug
+            next_suffix[base] += len(slugs)
+        groups = {base: group for base, group in groups.items() if group}
+        window *= 2
+
+
+def _write_batch(products):
+    with transaction.atomic():
+        assign_slugs(products)
+        index_products(Product.objects.bulk_create(products))
+
+
+def import_products(rows, batch_size=1000, on_error=None):
+    """
+    Insert ``rows`` as products with bulk_create, ``batch_size`` rows per
+    transaction, holding at most one batch in memory.
+
+    Invalid rows are skipped and passed to ``on_error(line, message)``.
+    Returns ``(imported, skipped)``.
+    """
+    subcategories = subcategory_map()
+    imported = skipped = 0
+    batch = []
+    for line, row in enumerate(rows, start=1):
+        try:
+            batch.append(parse_row(row, subcategories))
+        except ImportRowError as e:
+            skipped += 1
+            if on_error is not None:
+                on_error(line, str(e))
+            continue
+        if len(batch) == batch_size:
+            _write_batch(batch)
+            imported += len(batch)
+            batch = []
+    if batch:
+        _write_batch(batch)
+        imported += len(batch)
+
+    # bulk_create skips the Product signals, so retire the catalog cache and tree snapshots once here
+    if imported:
+        bump_catalog_version()
+        bump_tree_version()
+    return imported, skipped
@@ -0,0 +1,215 @@
+"""
+Per-endpoint request statistics: wall time, query count and database time
+for every resolved URL name, kept in fixed-bucket histograms in this process.
+"""
+import bisect
+import collections
+import contextvars
+import json
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+UNRESOLVED = '<unresolved>'
+
+# Upper bounds of the latency buckets: 0.25 ms to ~74 s in steps of 2 ** (1/4)
+BUCKET_BOUNDS_MS = tuple(0.25 * 2 ** (step / 4) for step in range(73))
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS_MS) + 1)
+        self.total = 0
+        self.max = 0.0
+
+    def add(self, value_ms):
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS_MS, value_ms)] += 1
+        self.total += 1
+        self.max = max(self.max, value_ms)
+
+    def percentile(self, pct):
+        # Report the upper bound of the bucket holding the pct-th value, capped at the max seen
+        rank = pct / 100 * self.total
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                bound = BUCKET_BOUNDS_MS[index] if index < len(BUCKET_BOUNDS_MS) else self.max
+                return min(bound, self.max)
+        return 0.0
+
+
+class EndpointStats:
+    def __init__(self):
+        self.latency = Histogram()
+        self.queries = 0
+        self.max_queries = 0
+        self.db_ms = 0.0
+
+    def summary(self):
+        requests = self.latency.total
+        return {
+            'requests': requests,
+            'p50_ms': round(self.latency.percentile(50), 3),
+            'p95_ms': round(self.latency.percentile(95), 3),
+            'p99_ms': round(self.latency.percentile(99), 3),
+            'max_ms': round(self.latency.max, 3),
+            'queries_per_request': round(self.queries / requests, 2),
+            'max_queries': self.max_queries,
+            'db_ms_per_request': round(self.db_ms / requests, 3),
+        }
+
+
+_endpoints = collections.defaultdict(EndpointStats)
+_slow_requests = collections.deque(maxlen=settings.STORE_STATS_SLOW_SAMPLES)
+_lock = threading.Lock()
+_log = None
+# Held while writing the JSONL log, so stats readers and writers never wait on the file
+_log_lock = threading.Lock()
+
+# The recorder of the request being served; contextvars follow it into sync_to_async threads
+_current_recorder = contextvars.ContextVar('store_query_recorder', default=None)
+
+
+class QueryRecorder:
+    """
+    An execute wrapper counting and timing every query of a request started
+    at ``started`` (a perf_counter value). The SQL is only kept once the
+    request has run past STORE_STATS_SLOW_REQUEST_MS, for its slow sample.
+    """
+
+    def __init__(self, started):
+        self.count = 0
+        self.db_ms = 0.0
+        self.queries = []
+        self.slow_after = started + settings.STORE_STATS_SLOW_REQUEST_MS / 1000
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            finished = time.perf_counter()
+            elapsed_ms = (finished - started) * 1000
+            self.count += 1
+            self.db_ms += elapsed_ms
+            if finished >= self.slow_after:
+                # Numbered, since the queries run before the request turned slow are not kept
+                self.queries.append({'query': self.count, 'sql': sql, 'ms': round(elapsed_ms, 3), 'many': many})
+
+
+def record_query(execute, sql, params, many, context):
+    recorder = _current_recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+def install_query_recorder(connection):
+    """
+    Add record_query to the execute wrappers of ``connection``.
+
+    Connections are per thread, and under ASGI the ORM runs in other threads
+    than the middleware, so every connection carries the wrapper and it
+    reports to whichever request is current. It goes first in the list
+    because connection.execute_wrapper() pops the last entry on exit.
+    """
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_query)
+
+
+def _write_log(path, record):
+    global _log
+    line = json.dumps(record) + '\n'
+    with _log_lock:
+        if _log is None or _log.name != path:
+            if _log is not None:
+                _log.close()
+            _log = open(path, 'a', buffering=1)
+        _log.write(line)
+
+
+def record_request(request, recorder, elapsed_ms):
+    match = getattr(request, 'resolver_match', None)
+    endpoint = match.view_name if match is not None else UNRESOLVED
+    slow = elapsed_ms >= settings.STORE_STATS_SLOW_REQUEST_MS
+    with _lock:
+        stats = _endpoints[endpoint]
+        stats.latency.add(elapsed_ms)
+        stats.queries += recorder.count
+        stats.max_queries = max(stats.max_queries, recorder.count)
+        stats.db_ms += recorder.db_ms
+        if slow:
+            _slow_requests.append({
+                'endpoint': endpoint,
+                'method': request.method,
+                'path': request.get_full_path(),
+                'ms': round(elapsed_ms, 3),
+                'db_ms': round(recorder.db_ms, 3),
+                'query_count': recorder.count,
+                'queries': recorder.queries,
+            })
+    if settings.STORE_STATS_JSONL:
+        _write_log(settings.STORE_STATS_JSONL, {
+            'endpoint': endpoint,
+            'method': request.method,
+            'ms': round(elapsed_ms, 3),
+            'queries': recorder.count,
+            'db_ms': round(recorder.db_ms, 3),
+            'slow': slow,
+        })
+
+
+def request_stats():
+    with _lock:
+        return {
+            'endpoints': {endpoint: stats.summary() for endpoint, stats in sorted(_endpoints.items())},
+            'slow_requests': list(_slow_requests),
+        }
+
+
+def reset_request_stats():
+    with _lock:
+        _endpoints.clear()
+        _slow_requests.clear()
+
+
+class RequestStatsMiddleware:
+    """
+    Time each request and the queries it runs, whichever thread runs them.
+    List it first in MIDDLEWARE so the wall time covers the whole stack.
+    Streaming responses are timed until the view returns them, not while their body streams.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        recorder = QueryRecorder(started)
+        token = _current_recorder.set(recorder)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_recorder.reset(token)
+        record_request(request, recorder, (time.perf_counter() - started) * 1000)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        recorder = QueryRecorder(started)
+        token = _current_recorder.set(recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_recorder.reset(token)
+        record_request(request, recorder, (time.perf_counter() - started) * 1000)
+        return response
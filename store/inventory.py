@@ -0,0 +1,177 @@
+"""
+Stock levels and cart reservations.
+
+A stock-tracked product keeps its unreserved stock in StockShard rows.
+Adding to a cart reserves units with conditional decrements,
+``UPDATE ... SET available = available - n WHERE available >= n``, trying
+the shards from a random one onwards, so shoppers of a hot product mostly
+lock different rows and no shard can go below zero. Checkout consumes the
+cart's reservations without touching the stock rows. Reservations that are
+not checked out within STORE_RESERVATION_TTL seconds go back to stock when
+release_expired_reservations runs.
+
+Products without shards are not stock-tracked and are never refused.
+Everything here must run inside the caller's transaction: a refusal raises
+OutOfStock midway, and the rollback returns what was already taken.
+"""
+import collections
+import datetime
+import random
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import Reservation, StockShard
+
+
+class OutOfStock(Exception):
+    def __init__(self, product_id, available):
+        super().__init__(f'Only {available} of product {product_id} left in stock.')
+        self.product_id = product_id
+        self.available = available
+
+
+def set_stock(product_id, quantity, shards=1):
+    """Make ``quantity`` units available, spread evenly over ``shards`` rows."""
+    with transaction.atomic():
+        StockShard.objects.filter(product_id=product_id).delete()
+        StockShard.objects.bulk_create([
+            StockShard(product_id=product_id, shard=shard, available=quantity // shards + (shard < quantity % shards))
+            for shard in range(shards)
+        ])
+
+
+def stock_shards(product_ids):
+    """``{product_id: [(shard, available), ...]}`` for the stock-tracked products among ``product_ids``."""
+    shards = collections.defaultdict(list)
+    rows = StockShard.objects.filter(product_id__in=product_ids).order_by('shard')
+    for product_id, shard, available in rows.values_list('product_id', 'shard', 'available'):
+        shards[product_id].append((shard, available))
+    return shards
+
+
+def available_stock(product_id):
+    return StockShard.objects.filter(product_id=product_id).aggregate(total=Sum('available'))['total'] or 0
+
+
+def _take(product_id, shards, quantity):
+    # Shard counts may be stale by the time they are decremented, so a round that
+    # comes up short re-reads them once before refusing
+    taken = []
+    for attempt in range(2):
+        start = random.randrange(len(shards))
+        for shard, available in shards[start:] + shards[:start]:
+            want = min(quantity, available)
+            if want and StockShard.objects.filter(
+                product_id=product_id, shard=shard, available__gte=want,
+            ).update(available=F('available') - want):
+                taken.append((shard, want))
+                quantity -= want
+                if not quantity:
+                    return taken
+        shards = stock_shards([product_id])[product_id]
+        if sum(available for shard, available in shards) < quantity:
+            break
+    raise OutOfStock(product_id, sum(available for shard, available in shards) + sum(want for shard, want in taken))
+
+
+def _restock(product_id, shard, quantity):
+    if not StockShard.objects.filter(product_id=product_id, shard=shard).update(available=F('available') + quantity):
+        # The shards were redrawn by set_stock since: any remaining one takes the units back
+        first = StockShard.objects.filter(product_id=product_id).order_by('shard').values_list('id', flat=True).first()
+        if first is not None:
+            StockShard.objects.filter(id=first).update(available=F('available') + quantity)
+
+
+def _reserve(cart_id, product_id, shards, quantity):
+    expires_at = timezone.now() + datetime.timedelta(seconds=settings.STORE_RESERVATION_TTL)
+    for shard, taken in _take(product_id, shards, quantity):
+        reservation = Reservation.objects.filter(cart_id=cart_id, product_id=product_id, shard=shard)
+        if not reservation.update(quantity=F('quantity') + taken, expires_at=expires_at):
+            # Insert at zero (a concurrent insert wins harmlessly), then count these units
+            Reservation.objects.bulk_create(
+                [Reservation(cart_id=cart_id, product_id=product_id, shard=shard, expires_at=expires_at)],
+                ignore_conflicts=True,
+            )
+            reservation.update(quantity=F('quantity') + taken, expires_at=expires_at)
+
+
+def reserve(cart_id, product_id, quantity):
+    """Reserve ``quantity`` more units of ``product_id`` for the cart; a no-op for untracked products."""
+    shards = stock_shards([product_id])
+    if shards:
+        _reserve(cart_id, product_id, shards[product_id], quantity)
+
+
+def release(cart_id, product_id, quantity):
+    """Return up to ``quantity`` of the units the cart holds of ``product_id`` to stock."""
+    rows = Reservation.objects.select_for_update().filter(cart_id=cart_id, product_id=product_id).order_by('shard')
+    for reservation_id, shard, held in rows.values_list('id', 'shard', 'quantity'):
+        if not quantity:
+            return
+        returned = min(quantity, held)
+        if returned == held:
+            Reservation.objects.filter(id=reservation_id).delete()
+        else:
+            Reservation.objects.filter(id=reservation_id).update(quantity=F('quantity') - returned)
+        _restock(product_id, shard, returned)
+        quantity -= returned
+
+
+def _locked_reservations(cart_id, product_ids):
+    # Locked, so the expiry job skips these rows instead of restocking units this transaction counts as held
+    reserved = collections.Counter()
+    rows = Reservation.objects.select_for_update().filter(cart_id=cart_id, product_id__in=product_ids).order_by('id')
+    for product_id, quantity in rows.values_list('product_id', 'quantity'):
+        reserved[product_id] += quantity
+    return reserved
+
+
+def hold(cart_id, quantities, shards=None):
+    """
+    Make the cart's reservations match ``{product_id: quantity}``, reserving
+    or releasing the difference, e.g. after expired units went back to stock.
+    """
+    if shards is None:
+        shards = stock_shards(list(quantities))
+    if not shards:
+        return
+    reserved = _locked_reservations(cart_id, list(shards))
+    # A fixed order keeps concurrent carts from locking the same rows in opposite orders
+    for product_id in sorted(shards):
+        difference = quantities[product_id] - reserved[product_id]
+        if difference > 0:
+            _reserve(cart_id, product_id, shards[product_id], difference)
+        elif difference < 0:
+            release(cart_id, product_id, -difference)
+
+
+def consume_reservations(cart_id, quantities):
+    """At checkout: make sure the cart holds ``quantities`` of every tracked product, then mark them sold."""
+    shards = stock_shards(list(quantities))
+    if not shards:
+        return
+    hold(cart_id, quantities, shards)
+    # Still locked by hold; reservations of products no longer in the cart expire back to stock
+    Reservation.objects.filter(cart_id=cart_id, product_id__in=list(shards)).delete()
+
+
+def release_expired_reservations(limit=1000):
+    """Return up to ``limit`` expired reservations to stock. Returns how many were released."""
+    with transaction.atomic():
+        # Reservations a checkout has locked in hold() are skipped, not waited for
+        expired = list(
+            Reservation.objects.select_for_update(skip_locked=True).filter(expires_at__lte=timezone.now())
+            .order_by('id').values_list('id', 'product_id', 'shard', 'quantity')[:limit]
+        )
+        if not expired:
+            return 0
+        Reservation.objects.filter(id__in=[row[0] for row in expired]).delete()
+        returned = collections.Counter()
+        for reservation_id, product_id, shard, quantity in expired:
+            returned[product_id, shard] += quantity
+        for (product_id, shard), quantity in sorted(returned.items()):
+            _restock(product_id, shard, quantity)
+    return len(expired)
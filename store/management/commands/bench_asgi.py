@@ -0,0 +1,97 @@
+import asyncio
+import itertools
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import AsyncClient, Client
+from django.test.utils import override_settings
+
+from store import async_views, views
+from store.benchmarks import isolated_database, read_urlconf, seed_products, seed_shopper, seed_subcategories, summarize
+from store.models import Order, Product
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare throughput and latency of the read-heavy endpoints served by the sync views '
+        'through the WSGI handler and by the async views through the ASGI handler.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=5000)
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--concurrency', type=int, default=64)
+        parser.add_argument('--with-cache', action='store_true', help='Keep the configured cache instead of measuring the ORM path.')
+
+    def handle(self, *args, **options):
+        overrides = {'ALLOWED_HOSTS': ['testserver']}
+        if not options['with_cache']:
+            overrides['CACHES'] = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+        with isolated_database(), override_settings(**overrides):
+            seed_products(options['products'], seed_subcategories())
+            products = list(Product.objects.all()[:200])
+            user = seed_shopper('shopper', products)
+            order_id = Order.objects.filter(user=user).values_list('id', flat=True).first()
+            paths = [
+                '/products/?page_size=50',
+                f'/products/{products[0].id}/',
+                '/cart/',
+                f'/order/{order_id}/',
+                '/order/history/',
+            ]
+            login = Client()
+            login.force_login(user)
+            cookies = login.cookies
+            requests = list(itertools.islice(itertools.cycle(paths), options['requests']))
+
+            with override_settings(ROOT_URLCONF=read_urlconf(views)):
+                wsgi = self.run_wsgi(requests, cookies, options['concurrency'])
+            with override_settings(ROOT_URLCONF=read_urlconf(async_views)):
+                asgi = asyncio.run(self.run_asgi(requests, cookies, options['concurrency']))
+
+        report = {'requests': len(requests), 'concurrency': options['concurrency'], 'wsgi': wsgi, 'asgi': asgi}
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def run_wsgi(self, requests, cookies, concurrency):
+        local = threading.local()
+
+        def fetch(path):
+            if not hasattr(local, 'client'):
+                local.client = Client()
+                local.client.cookies = cookies
+            started = time.perf_counter()
+            response = local.client.get(path)
+            assert response.status_code == 200, (path, response.status_code)
+            return time.perf_counter() - started
+
+        def close_connection(path):
+            connections.close_all()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            latencies = list(pool.map(fetch, requests))
+            list(pool.map(close_connection, range(concurrency)))
+        return self.result(latencies, time.perf_counter() - started)
+
+    async def run_asgi(self, requests, cookies, concurrency):
+        client = AsyncClient()
+        client.cookies = cookies
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def fetch(path):
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.get(path)
+                assert response.status_code == 200, (path, response.status_code)
+                return time.perf_counter() - started
+
+        started = time.perf_counter()
+        latencies = await asyncio.gather(*[fetch(path) for path in requests])
+        return self.result(latencies, time.perf_counter() - started)
+
+    def result(self, latencies, elapsed):
+        return {'throughput_rps': round(len(latencies) / elapsed, 1), 'latency': summarize(latencies)}
@@ -0,0 +1,97 @@
+import json
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from store.benchmarks import isolated_database, seed_products, seed_subcategories, summarize
+from store.inventory import available_stock, set_stock
+from store.models import Cart, OrderItem, Product, Reservation, SalesRollup
+
+
+class Command(BaseCommand):
+    help = (
+        'Stress checkout of one hot product: --shoppers threads each add it to their cart '
+        'and check out --rounds times against less stock than they want, once per --shards '
+        'value, in a throwaway test database. Checkouts also add to the sales rollups, split over as '
+        'many rows as the product\'s stock unless --rollup-shards is given. '
+        'Reports throughput and whether anything was oversold. '
+        'SQLite locks the whole database per writer, so there shards cannot help and '
+        'colliding checkouts fail as errors; measure sharding against MySQL.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shoppers', type=int, default=16)
+        parser.add_argument('--rounds', type=int, default=20)
+        parser.add_argument('--stock', type=int, default=200)
+        parser.add_argument('--shards', type=int, nargs='*', default=[1, 8])
+        parser.add_argument('--rollup-shards', type=int, help='Sales rollup rows per key in every run.')
+
+    def handle(self, *args, **options):
+        report = {key: options[key] for key in ('shoppers', 'rounds', 'stock')}
+        report['runs'] = {}
+        with isolated_database(), override_settings(ALLOWED_HOSTS=['testserver']):
+            seed_products(1, seed_subcategories())
+            product_id = Product.objects.values_list('id', flat=True).get()
+            for shards in options['shards']:
+                OrderItem.objects.all().delete()
+                Reservation.objects.all().delete()
+                SalesRollup.objects.all().delete()
+                users = User.objects.bulk_create([
+                    User(username=f'shopper-{shards}-{index}') for index in range(options['shoppers'])
+                ])
+                Cart.objects.bulk_create([Cart(user=user) for user in users])
+                set_stock(product_id, options['stock'], shards)
+                with override_settings(STORE_SALES_ROLLUP_SHARDS=options['rollup_shards'] or shards):
+                    report['runs'][shards] = self.run_shoppers(users, product_id, options['rounds'], options['stock'])
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def run_shoppers(self, users, product_id, rounds, stock):
+        barrier = threading.Barrier(len(users))
+        statuses = []
+        latencies = []
+
+        def shop(user):
+            client = Client(raise_request_exception=False)
+            client.force_login(user)
+            try:
+                barrier.wait()
+                for _ in range(rounds):
+                    started = time.perf_counter()
+                    status = client.post(reverse('add-to-cart', args=[product_id])).status_code
+                    if status == 200:
+                        status = client.post(reverse('order-create')).status_code
+                    latencies.append(time.perf_counter() - started)
+                    statuses.append(status)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=shop, args=[user]) for user in users]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        sold = sum(OrderItem.objects.filter(product_id=product_id).values_list('quantity', flat=True))
+        left = available_stock(product_id)
+        held = sum(Reservation.objects.filter(product_id=product_id).values_list('quantity', flat=True))
+        return {
+            'checkouts': statuses.count(200),
+            'refused': statuses.count(409),
+            'errors': len(statuses) - statuses.count(200) - statuses.count(409),
+            'sold': sold,
+            'left': left,
+            'held': held,
+            'oversold': sold > stock or sold + left + held != stock,
+            'rollup_rows': SalesRollup.objects.count(),
+            'rollup_units': sum(SalesRollup.objects.values_list('units', flat=True)),
+            'checkouts_per_second': round(statuses.count(200) / elapsed, 1),
+            'latency': summarize(latencies),
+        }
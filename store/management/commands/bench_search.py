@@ -0,0 +1,39 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from store.benchmarks import isolated_database, sample_queries, seed_products, seed_subcategories, summarize
+from store.search import search_product_payload
+
+
+class Command(BaseCommand):
+    help = 'Benchmark product search latency on a seeded catalog in a throwaway test database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=500000)
+        parser.add_argument('--queries', type=int, default=500)
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        with isolated_database():
+            started = time.perf_counter()
+            seed_products(options['products'], seed_subcategories(), seed=options['seed'])
+            seeded_in = time.perf_counter() - started
+
+            latencies = []
+            matched = 0
+            for query in sample_queries(options['queries'], seed=options['seed']):
+                started = time.perf_counter()
+                results = search_product_payload(query, options['limit'])
+                latencies.append(time.perf_counter() - started)
+                matched += bool(results)
+
+        report = {
+            'products': options['products'],
+            'seed_seconds': round(seeded_in, 2),
+            'queries_with_results': matched,
+            'latency': summarize(latencies),
+        }
+        self.stdout.write(json.dumps(report, indent=2))
@@ -0,0 +1,85 @@
+import json
+import time
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection, reset_queries
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from store.benchmarks import isolated_database, seed_products, seed_subcategories
+from store.models import Cart, Product
+from store.sessions import flush_sessions
+
+ENGINES = (
+    'django.contrib.sessions.backends.db',
+    'django.contrib.sessions.backends.cached_db',
+    'store.sessions',
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Count the django_session reads and writes per login and per checkout flow '
+        'under each session engine, in a throwaway test database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--flows', type=int, default=200)
+        parser.add_argument('--engines', nargs='*', default=ENGINES)
+
+    def handle(self, *args, **options):
+        report = {'flows': options['flows'], 'engines': {}}
+        # The deferred writes are flushed explicitly at the end so they are counted on this connection
+        with isolated_database(), override_settings(ALLOWED_HOSTS=['testserver'], STORE_SESSION_WRITE_DELAY=3600):
+            seed_products(200, seed_subcategories())
+            products = list(Product.objects.values_list('id', flat=True)[:200])
+            for engine in options['engines']:
+                # force_login needs no password, so skip the slow hashing
+                users = User.objects.bulk_create([
+                    User(username=f'{engine}-{index}') for index in range(options['flows'])
+                ])
+                Cart.objects.bulk_create([Cart(user=user) for user in users])
+                cache.clear()
+                with override_settings(SESSION_ENGINE=engine):
+                    report['engines'][engine] = self.run_flows(users, products)
+        self.stdout.write(json.dumps(report, indent=2))
+
+    def checkout(self, client, product_id):
+        client.post(reverse('add-to-cart', args=[product_id]))
+        client.post(reverse('order-create'))
+        # A double-clicked pay button submits twice
+        client.post(reverse('payment-initiate'))
+        client.post(reverse('payment-initiate'))
+        client.get(reverse('payment-confirm'))
+        client.get(reverse('order-history'))
+
+    def run_flows(self, users, products):
+        counts = {'login': [0, 0], 'checkout': [0, 0]}
+
+        def capture(step, action):
+            # Start from an empty log: the connection only keeps the last 9000 queries
+            reset_queries()
+            with CaptureQueriesContext(connection) as queries:
+                action()
+            for query in queries.captured_queries:
+                if 'django_session' in query['sql']:
+                    counts[step][not query['sql'].startswith('SELECT')] += 1
+
+        started = time.perf_counter()
+        for index, user in enumerate(users):
+            client = Client()
+            capture('login', lambda: client.force_login(user))
+            capture('checkout', lambda: self.checkout(client, products[index % len(products)]))
+        # Deferred writes land on the checkout's account
+        capture('checkout', flush_sessions)
+        elapsed = time.perf_counter() - started
+
+        report = {}
+        for step, (reads, writes) in counts.items():
+            report[f'{step}_session_reads'] = round(reads / len(users), 2)
+            report[f'{step}_session_writes'] = round(writes / len(users), 2)
+        report['ms_per_flow'] = round(elapsed / len(users) * 1000, 3)
+        return report
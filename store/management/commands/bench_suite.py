@@ -0,0 +1,356 @@
+import collections
+import copy
+import itertools
+import json
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from importlib import import_module
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Max, Min
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import URLPattern, get_resolver, reverse
+from django.utils import timezone
+
+from store.analytics import rebuild_sales_rollups
+from store.benchmarks import (
+    BRANDS, isolated_database, sample_queries, seed_orders, seed_products, seed_subcategories, seed_users, summarize,
+)
+from store.instrumentation import request_stats, reset_request_stats
+from store.models import Cart, CartItem, Order, Product, Subcategory
+from store.recommendations import rebuild_related_products
+
+BASELINE_PATH = Path(__file__).resolve().parents[2] / 'bench_baseline.json'
+
+PASSWORD = 'benchmark'
+
+# Logged-in routes spread their requests over this many users
+SHOPPERS = 16
+
+# A route answering fewer of its requests with 2xx/3xx is failing, and its query counts are not baselined
+MIN_SUCCESS_RATE = 0.9
+
+
+class Scenario:
+    """
+    What one request to a route looks like; ``client`` is 'user', 'staff' or
+    'fresh', and ``prepare`` sets up state outside the timed request.
+    """
+
+    def __init__(self, send, client='user', prepare=None):
+        self.send = send
+        self.client = client
+        self.prepare = prepare
+
+
+def _cart_batch(client, ctx, rng):
+    operations = [
+        {'op': rng.choice(['add', 'set', 'remove']), 'product_id': ctx.product_id(rng), 'quantity': rng.randint(1, 3)}
+        for _ in range(5)
+    ]
+    return client.post(reverse('cart-batch'), json.dumps({'operations': operations}), content_type='application/json')
+
+
+def _fill_cart(client, ctx, rng):
+    cart_id = Cart.objects.filter(user=client.bench_user).values_list('id', flat=True).get()
+    CartItem.objects.bulk_create(
+        [CartItem(cart_id=cart_id, product_id=ctx.product_id(rng), quantity=rng.randint(1, 3)) for _ in range(3)],
+        ignore_conflicts=True,
+    )
+
+
+def _put_in_cart(client, ctx, rng):
+    # Sent through the view, so the cart also holds the reservation the timed request changes
+    client.bench_product_id = ctx.product_id(rng)
+    client.post(reverse('add-to-cart', args=[client.bench_product_id]))
+
+
+def _logout(client, ctx, rng):
+    client.force_login(ctx.user(rng))
+    return client.post(reverse('user-logout'))
+
+
+SCENARIOS = {
+    'product-list': Scenario(lambda client, ctx, rng: client.get(
+        reverse('product-list'), {'page_size': 50, **rng.choice([{}, {'brand': rng.choice(BRANDS)}, {'max_price': 500}])},
+    )),
+    'product-detail': Scenario(lambda client, ctx, rng: client.get(reverse('product-detail', args=[ctx.product_id(rng)]))),
+    'product-batch': Scenario(lambda client, ctx, rng: client.get(
+        reverse('product-batch'), {'ids': ','.join(str(ctx.product_id(rng)) for _ in range(20))},
+    )),
+    'product-related': Scenario(lambda client, ctx, rng: client.get(reverse('product-related', args=[ctx.product_id(rng)]))),
+    'category-tree': Scenario(lambda client, ctx, rng: client.get(reverse('category-tree'))),
+    'product-search': Scenario(lambda client, ctx, rng: client.get(reverse('product-search'), {'q': rng.choice(ctx.queries)})),
+    'product-create': Scenario(lambda client, ctx, rng: client.post(
+        reverse('product-create'),
+        {'name': f'Bench product {next(ctx.counter)}', 'price': '19.99', 'subcategory': rng.choice(ctx.subcategories)},
+    )),
+    'product-update': Scenario(lambda client, ctx, rng: client.put(
+        reverse('product-update', args=[ctx.product_id(rng)]), 'price=21.50', content_type='application/x-www-form-urlencoded',
+    )),
+    'product-delete': Scenario(lambda client, ctx, rng: client.delete(reverse('product-delete', args=[ctx.deletable_id()]))),
+    'user-registration': Scenario(lambda client, ctx, rng: client.post(
+        reverse('user-registration'), {'username': f'bench{next(ctx.counter)}', 'password': 'Bench-password-123'},
+    ), client='fresh'),
+    'user-login': Scenario(lambda client, ctx, rng: client.post(
+        reverse('user-login'), {'username': ctx.user(rng).username, 'password': PASSWORD},
+    ), client='fresh'),
+    'user-logout': Scenario(_logout, client='fresh'),
+    'user-profile': Scenario(lambda client, ctx, rng: client.get(reverse('user-profile'))),
+    'password-reset': Scenario(lambda client, ctx, rng: client.get(reverse('password-reset')), client='fresh'),
+    'password-change': Scenario(lambda client, ctx, rng: client.get(reverse('password-change'))),
+    'cart-detail': Scenario(lambda client, ctx, rng: client.get(reverse('cart-detail'))),
+    'add-to-cart': Scenario(lambda client, ctx, rng: client.post(reverse('add-to-cart', args=[ctx.product_id(rng)]))),
+    'remove-from-cart': Scenario(
+        lambda client, ctx, rng: client.post(reverse('remove-from-cart', args=[client.bench_product_id])), prepare=_put_in_cart,
+    ),
+    'update-cart-item': Scenario(lambda client, ctx, rng: client.post(
+        reverse('update-cart-item', args=[client.bench_product_id]), {'quantity': rng.randint(1, 5)},
+    ), prepare=_put_in_cart),
+    'cart-batch': Scenario(_cart_batch),
+    'order-create': Scenario(lambda client, ctx, rng: client.post(reverse('order-create')), prepare=_fill_cart),
+    'order-detail': Scenario(lambda client, ctx, rng: client.get(reverse('order-detail', args=[ctx.order_id(client)]))),
+    'order-history': Scenario(lambda client, ctx, rng: client.get(reverse('order-history'))),
+    'order-export': Scenario(lambda client, ctx, rng: client.get(
+        reverse('order-export'), {'format': 'jsonl', 'since': ctx.started_at.isoformat()},
+    ), client='staff'),
+    'request-stats': Scenario(lambda client, ctx, rng: client.get(reverse('request-stats')), client='staff'),
+    'sales-analytics': Scenario(lambda client, ctx, rng: client.get(
+        reverse('sales-analytics'), {'group_by': rng.choice(['day', 'subcategory,brand', 'day,brand'])},
+    ), client='staff'),
+    'payment-initiate': Scenario(lambda client, ctx, rng: client.post(reverse('payment-initiate'))),
+    'payment-confirm': Scenario(lambda client, ctx, rng: client.get(reverse('payment-confirm'))),
+    'payment-cancel': Scenario(lambda client, ctx, rng: client.get(reverse('payment-cancel'))),
+}
+
+
+class Context:
+    """The seeded data the scenarios draw from, shared by every worker thread."""
+
+    def __init__(self, requests_per_route, seed):
+        ids = Product.objects.aggregate(first=Min('id'), last=Max('id'))
+        # The newest products are set aside for product-delete so no other scenario hits a deleted row
+        self.product_range = (ids['first'], ids['last'] - requests_per_route)
+        self._deletable = iter(range(ids['last'] - requests_per_route + 1, ids['last'] + 1))
+        self.users = list(User.objects.filter(username__startswith='user').order_by('id')[:1000])
+        if len(self.users) < SHOPPERS:
+            raise CommandError(f'--users must be at least {SHOPPERS}.')
+        self.shoppers = self.users[:SHOPPERS]
+        self.staff = User.objects.get(username='bench-staff')
+        self.subcategories = list(Subcategory.objects.order_by('id').values_list('id', flat=True))
+        # Existing carts keep the first requests of concurrent threads out of a get_or_create race
+        Cart.objects.bulk_create([Cart(user=user) for user in self.shoppers], ignore_conflicts=True)
+        # Log everyone in once up front; worker threads reuse the session cookies
+        self.cookies = {}
+        for user in [*self.shoppers, self.staff]:
+            client = Client()
+            client.force_login(user)
+            self.cookies[user.id] = client.cookies
+        self.orders = dict(
+            Order.objects.filter(user__in=self.users).values('user_id').annotate(first=Min('id')).values_list('user_id', 'first')
+        )
+        self.queries = sample_queries(200, seed)
+        self.counter = itertools.count()
+        self.started_at = timezone.now()
+        self._lock = threading.Lock()
+
+    def product_id(self, rng):
+        return rng.randint(*self.product_range)
+
+    def deletable_id(self):
+        with self._lock:
+            return next(self._deletable)
+
+    def user(self, rng):
+        return rng.choice(self.users)
+
+    def order_id(self, client):
+        return self.orders.get(client.bench_user.id, 0)
+
+    def warm_sessions(self):
+        # Sessions made by earlier routes can push these out of the cache; their reload is not what a route measures
+        engine = import_module(settings.SESSION_ENGINE)
+        for cookies in self.cookies.values():
+            engine.SessionStore(cookies[settings.SESSION_COOKIE_NAME].value).load()
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a deterministic large dataset in a throwaway test database, drive every named route in '
+        'ecommerce/urls.py with concurrent in-process clients, and report throughput, latency percentiles '
+        'and queries per request as JSON. Fails when a route needs more queries than the stored baseline, '
+        'or answers fewer than 90% of its requests with 2xx/3xx.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100000)
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--orders', type=int, default=1000000)
+        parser.add_argument('--requests', type=int, default=200, help='Requests per route.')
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--routes', nargs='*', help='Only run these URL names.')
+        parser.add_argument('--output', help='Write the report here instead of standard output.')
+        parser.add_argument('--baseline', default=str(BASELINE_PATH))
+        parser.add_argument('--update-baseline', action='store_true', help='Store this run as the new baseline.')
+
+    def handle(self, *args, **options):
+        names = [pattern.name for pattern in get_resolver().url_patterns if isinstance(pattern, URLPattern) and pattern.name]
+        uncovered = sorted(set(names) - set(SCENARIOS))
+        if uncovered:
+            raise CommandError(f"No benchmark scenario for: {', '.join(uncovered)}")
+        routes = options['routes'] or names
+
+        # DEBUG off as in production: the debug error page runs queries of its own
+        with isolated_database(), override_settings(DEBUG=False, ALLOWED_HOSTS=['testserver']):
+            started = time.perf_counter()
+            seed_products(options['products'], seed_subcategories(), seed=options['seed'])
+            user_ids = seed_users(options['users'], password=PASSWORD)
+            lines = seed_orders(options['orders'], user_ids, seed=options['seed'])
+            rebuild_sales_rollups()
+            rebuild_related_products()
+            User.objects.create_user(username='bench-staff', password=PASSWORD, is_staff=True)
+            seeded_in = time.perf_counter() - started
+
+            ctx = Context(options['requests'], options['seed'])
+            results = {}
+            # Expected failures of broken routes would otherwise print a traceback per request
+            request_logger = logging.getLogger('django.request')
+            level = request_logger.level
+            request_logger.setLevel(logging.CRITICAL)
+            try:
+                for name in routes:
+                    results[name] = self.run_route(name, ctx, options)
+            finally:
+                request_logger.setLevel(level)
+
+        report = {
+            'dataset': {
+                'products': options['products'], 'users': options['users'], 'orders': options['orders'],
+                'order_items': lines, 'seed': options['seed'], 'seed_seconds': round(seeded_in, 1),
+            },
+            'requests_per_route': options['requests'],
+            'concurrency': options['concurrency'],
+            'routes': results,
+            'failing': self.failing(results),
+        }
+        if options['update_baseline']:
+            self.write_baseline(options['baseline'], results, report['failing'])
+        else:
+            report['regressions'] = self.compare(options['baseline'], results)
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            Path(options['output']).write_text(output)
+        else:
+            self.stdout.write(output)
+        errors = []
+        if report['failing']:
+            errors.append('Routes failing their requests:\n' + '\n'.join(
+                f'{name}: {statuses}' for name, statuses in report['failing'].items()
+            ))
+        if report.get('regressions'):
+            errors.append('Regressions against the baseline:\n' + '\n'.join(report['regressions']))
+        if errors:
+            raise CommandError('\n'.join(errors))
+
+    def run_route(self, name, ctx, options):
+        scenario = SCENARIOS[name]
+        local = threading.local()
+
+        def client_for(kind, index):
+            if kind == 'fresh':
+                return Client(raise_request_exception=False)
+            # Request i always acts as the same user, whatever thread sends it
+            user = ctx.staff if kind == 'staff' else ctx.shoppers[index % len(ctx.shoppers)]
+            clients = local.__dict__.setdefault('clients', {})
+            if user.id not in clients:
+                clients[user.id] = Client(raise_request_exception=False)
+                clients[user.id].cookies = copy.deepcopy(ctx.cookies[user.id])
+                clients[user.id].bench_user = user
+            return clients[user.id]
+
+        def send(index):
+            rng = random.Random(f"{options['seed']}:{name}:{index}")
+            client = client_for(scenario.client, index)
+            if scenario.prepare is not None:
+                scenario.prepare(client, ctx, rng)
+            started = time.perf_counter()
+            try:
+                response = scenario.send(client, ctx, rng)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                outcome = response.status_code
+            except Exception as e:
+                # e.g. a lock timeout while streaming; count it rather than abort the run
+                outcome = type(e).__name__
+            return time.perf_counter() - started, outcome
+
+        def close_connection(index):
+            connections.close_all()
+
+        ctx.warm_sessions()
+        reset_request_stats()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            outcomes = list(pool.map(send, range(options['requests'])))
+            list(pool.map(close_connection, range(options['concurrency'])))
+        elapsed = time.perf_counter() - started
+
+        stats = request_stats()['endpoints'].get(name, {})
+        return {
+            'throughput_rps': round(len(outcomes) / elapsed, 1),
+            'latency': summarize([latency for latency, status in outcomes]),
+            'queries_per_request': stats.get('queries_per_request'),
+            'max_queries': stats.get('max_queries'),
+            'statuses': dict(sorted(collections.Counter(str(status) for latency, status in outcomes).items())),
+        }
+
+    def failing(self, results):
+        """
+        Routes that mostly answered with errors: their query counts measure an
+        error path, so they neither pass as benchmarked nor go into a baseline.
+        """
+        failing = {}
+        for name, result in results.items():
+            statuses = result['statuses']
+            succeeded = sum(count for status, count in statuses.items() if status.isdigit() and 200 <= int(status) < 400)
+            if succeeded < MIN_SUCCESS_RATE * sum(statuses.values()):
+                failing[name] = statuses
+        return failing
+
+    def write_baseline(self, path, results, failing):
+        # Failing routes and routes left out of this run keep their stored counts
+        try:
+            baseline = json.loads(Path(path).read_text())
+        except FileNotFoundError:
+            baseline = {}
+        baseline.update(
+            (name, {'max_queries': result['max_queries']}) for name, result in results.items() if name not in failing
+        )
+        Path(path).write_text(json.dumps(baseline, indent=2, sort_keys=True) + '\n')
+
+    def compare(self, path, results):
+        """
+        Flag routes whose worst request needs more queries than the baseline.
+        Query counts do not depend on the dataset size or timing, unlike
+        latencies, so an N+1 shows up here at any scale.
+        """
+        try:
+            baseline = json.loads(Path(path).read_text())
+        except FileNotFoundError:
+            return []
+        regressions = []
+        for name, result in results.items():
+            expected = baseline.get(name, {}).get('max_queries')
+            if expected is not None and (result['max_queries'] or 0) > expected:
+                regressions.append(f"{name}: {result['max_queries']} queries per request, baseline {expected}")
+        return regressions
@@ -0,0 +1,40 @@
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from store.images import build_product_images, needs_variants
+from store.models import Product
+from store.pagination import iterate_by_id
+
+
+class Command(BaseCommand):
+    help = 'Backfill the resized variants of product images that are missing or out of date.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Rebuild every product image, not just stale ones.')
+        parser.add_argument('--workers', type=int, default=settings.STORE_IMAGE_WORKERS or 1)
+        parser.add_argument('--batch-size', type=int, default=100)
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--workers and --batch-size must be positive integers.')
+
+        rows = iterate_by_id(Product.objects.exclude(image='').values('id', 'image', 'image_variants'), options['batch_size'])
+        started = time.perf_counter()
+        updated = 0
+        with ProcessPoolExecutor(max_workers=options['workers']) as executor:
+            batch = []
+            for row in rows:
+                product = Product(id=row['id'], image=row['image'], image_variants=row['image_variants'])
+                if options['all'] or needs_variants(product):
+                    batch.append(product)
+                if len(batch) == options['batch_size']:
+                    updated += build_product_images(batch, executor)
+                    batch = []
+            if batch:
+                updated += build_product_images(batch, executor)
+
+        self.stdout.write(json.dumps({'updated': updated, 'seconds': round(time.perf_counter() - started, 2)}))
@@ -0,0 +1,40 @@
+import json
+import resource
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from store.recommendations import rebuild_related_products, refresh_related_products
+
+
+class Command(BaseCommand):
+    help = (
+        'Rank each product\'s "frequently bought together" list from the order history. '
+        '--refresh re-ranks only the products bought since the previous run.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--refresh', action='store_true')
+        parser.add_argument('--top-k', type=int, default=settings.STORE_RELATED_PRODUCTS)
+        parser.add_argument(
+            '--partitions', type=int, default=1,
+            help='Rank the products in this many passes over the orders, dividing peak memory accordingly.',
+        )
+        parser.add_argument('--chunk-size', type=int, default=10000, help='Orders read per query.')
+
+    def handle(self, *args, **options):
+        for name in ('top_k', 'partitions', 'chunk_size'):
+            if options[name] < 1:
+                raise CommandError(f"--{name.replace('_', '-')} must be a positive integer.")
+
+        build = refresh_related_products if options['refresh'] else rebuild_related_products
+        started = time.perf_counter()
+        products = build(options['top_k'], options['partitions'], options['chunk_size'])
+        report = {
+            'products_ranked': products,
+            'seconds': round(time.perf_counter() - started, 2),
+            # ru_maxrss is in kilobytes on Linux
+            'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        }
+        self.stdout.write(json.dumps(report))
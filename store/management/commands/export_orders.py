@@ -0,0 +1,48 @@
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from store.exports import EXPORT_FORMATS, ExportError, export_orders, parse_moment
+
+
+class Command(BaseCommand):
+    help = (
+        'Stream every order line as CSV or JSON lines, optionally gzipped. '
+        '--since/--until select orders placed in [since, until); --feed exports '
+        'orders placed since the last run of that feed and settled for STORE_ORDER_SETTLE_SECONDS.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='csv')
+        parser.add_argument('--since', help='ISO date or datetime, inclusive.')
+        parser.add_argument('--until', help='ISO date or datetime, exclusive.')
+        parser.add_argument('--feed', help='Name of an incremental feed, e.g. finance.')
+        parser.add_argument('--gzip', action='store_true')
+        parser.add_argument('--output', default='-', help='File to write, or - for standard output.')
+        parser.add_argument('--chunk-size', type=int, default=settings.STORE_STREAM_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be a positive integer.')
+        try:
+            chunks = export_orders(
+                options['format'],
+                since=parse_moment(options['since'], 'since'),
+                until=parse_moment(options['until'], 'until'),
+                feed=options['feed'],
+                compress=options['gzip'],
+                chunk_size=options['chunk_size'],
+            )
+        except ExportError as e:
+            raise CommandError(str(e))
+
+        output = sys.stdout.buffer if options['output'] == '-' else open(options['output'], 'wb')
+        try:
+            for chunk in chunks:
+                output.write(chunk)
+        finally:
+            if output is not sys.stdout.buffer:
+                output.close()
+            else:
+                output.flush()
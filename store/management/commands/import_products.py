@@ -0,0 +1,52 @@
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.imports import IMPORT_FORMATS, import_products, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        'Stream products from a CSV or JSONL feed into the catalog in batched bulk inserts. '
+        'Rows need name, subcategory (an id or "category/subcategory") and price; '
+        'brand, description and image are optional.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Feed file, or - to read standard input.')
+        parser.add_argument('--format', choices=IMPORT_FORMATS, help='Defaults to the file extension.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--max-errors', type=int, default=20, help='How many skipped rows to print.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or path.rsplit('.', 1)[-1].lower()
+        if fmt not in IMPORT_FORMATS:
+            raise CommandError('Pass --format csv or --format jsonl.')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be a positive integer.')
+
+        def report_error(line, message):
+            if report_error.count < options['max_errors']:
+                self.stderr.write(f'row {line}: {message}')
+            report_error.count += 1
+        report_error.count = 0
+
+        stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        started = time.perf_counter()
+        try:
+            imported, skipped = import_products(read_rows(stream, fmt), options['batch_size'], report_error)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+        elapsed = time.perf_counter() - started
+
+        report = {
+            'imported': imported,
+            'skipped': skipped,
+            'seconds': round(elapsed, 2),
+            'rows_per_second': round((imported + skipped) / elapsed, 1) if elapsed else None,
+        }
+        self.stdout.write(json.dumps(report))
@@ -0,0 +1,32 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.analytics import AnalyticsError, parse_day, rebuild_sales_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute the sales rollups from the order lines, for every day or for '
+        'the days in [since, until), reading --chunk-size orders per query.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help='ISO date, inclusive.')
+        parser.add_argument('--until', help='ISO date, exclusive.')
+        parser.add_argument('--chunk-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be a positive integer.')
+        try:
+            since = parse_day(options['since'], 'since') if options['since'] else None
+            until = parse_day(options['until'], 'until') if options['until'] else None
+        except AnalyticsError as e:
+            raise CommandError(str(e))
+
+        started = time.perf_counter()
+        rows = rebuild_sales_rollups(since, until, options['chunk_size'])
+        report = {'rollup_rows': rows, 'seconds': round(time.perf_counter() - started, 2)}
+        self.stdout.write(json.dumps(report))
@@ -0,0 +1,29 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.inventory import release_expired_reservations
+
+
+class Command(BaseCommand):
+    help = (
+        'Return the cart reservations older than STORE_RESERVATION_TTL to stock, '
+        '--batch-size per transaction. Run it every minute or so.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be a positive integer.')
+        started = time.perf_counter()
+        released = 0
+        while True:
+            count = release_expired_reservations(options['batch_size'])
+            released += count
+            if count < options['batch_size']:
+                break
+        report = {'released': released, 'seconds': round(time.perf_counter() - started, 2)}
+        self.stdout.write(json.dumps(report))
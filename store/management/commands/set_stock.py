@@ -0,0 +1,33 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.inventory import available_stock, set_stock
+from store.models import Product
+
+
+class Command(BaseCommand):
+    help = (
+        'Set the unreserved stock of a product, spread over --shards counter rows. '
+        'Hot products take more shards so concurrent reservations lock different rows.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('product_id', type=int)
+        parser.add_argument('quantity', type=int)
+        parser.add_argument('--shards', type=int, default=1)
+
+    def handle(self, *args, **options):
+        if options['quantity'] < 0:
+            raise CommandError('quantity must not be negative.')
+        if options['shards'] < 1:
+            raise CommandError('--shards must be a positive integer.')
+        if not Product.objects.filter(id=options['product_id']).exists():
+            raise CommandError(f"No product {options['product_id']}.")
+        set_stock(options['product_id'], options['quantity'], options['shards'])
+        report = {
+            'product_id': options['product_id'],
+            'shards': options['shards'],
+            'available': available_stock(options['product_id']),
+        }
+        self.stdout.write(json.dumps(report))
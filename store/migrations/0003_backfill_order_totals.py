@@ -0,0 +1,39 @@
+from django.db import migrations
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_order_totals(apps, schema_editor):
+    Order = apps.get_model("store", "Order")
+    OrderItem = apps.get_model("store", "OrderItem")
+    Product = apps.get_model("store", "Product")
+
+    # Snapshot the current catalog price onto every existing order line
+    OrderItem.objects.update(
+        unit_price=Subquery(
+            Product.objects.filter(pk=OuterRef("product_id")).values("price")[:1]
+        )
+    )
+
+    line_totals = (
+        OrderItem.objects.filter(order=OuterRef("pk"))
+        .values("order")
+        .annotate(total=Sum(F("quantity") * F("unit_price")))
+        .values("total")
+    )
+    order_total = Coalesce(
+        Subquery(line_totals),
+        Value(0),
+        output_field=DecimalField(max_digits=12, decimal_places=2),
+    )
+    Order.objects.update(subtotal=order_total, total=order_total)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("store", "0002_order_totals_orderitem_unit_price"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_order_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "mysql":
+        schema_editor.execute(
+            "CREATE FULLTEXT INDEX store_product_search "
+            "ON store_product (name, brand, description)"
+        )
+    elif vendor == "sqlite":
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE store_product_search "
+            "USING fts5(name, brand, description)"
+        )
+        schema_editor.execute(
+            "INSERT INTO store_product_search (rowid, name, brand, description) "
+            "SELECT id, name, brand, description FROM store_product"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "mysql":
+        schema_editor.execute("DROP INDEX store_product_search ON store_product")
+    elif vendor == "sqlite":
+        schema_editor.execute("DROP TABLE store_product_search")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("store", "0004_order_product_updated_at"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-17 21:54
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_cart_items(apps, schema_editor):
+    CartItem = apps.get_model("store", "CartItem")
+
+    # Fold every duplicated (cart, product) pair into its oldest line
+    duplicates = (
+        CartItem.objects.values("cart", "product")
+        .annotate(lines=Count("id"), keep=Min("id"), quantity=Sum("quantity"))
+        .filter(lines__gt=1)
+    )
+    for duplicate in duplicates.iterator():
+        lines = CartItem.objects.filter(
+            cart=duplicate["cart"], product=duplicate["product"]
+        )
+        lines.exclude(id=duplicate["keep"]).delete()
+        lines.filter(id=duplicate["keep"]).update(quantity=duplicate["quantity"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0006_product_filter_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_cart_items, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="cartitem",
+            constraint=models.UniqueConstraint(
+                fields=("cart", "product"), name="cartitem_unique_cart_product"
+            ),
+        ),
+    ]
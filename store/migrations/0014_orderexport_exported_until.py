@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 23:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0013_order_user_created_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="orderexport",
+            name="exported_until",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
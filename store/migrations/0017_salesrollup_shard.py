@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-17 23:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("store", "0016_relatedproductsstate"),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name="salesrollup",
+            name="salesrollup_unique_day_subcategory_brand",
+        ),
+        migrations.AddField(
+            model_name="salesrollup",
+            name="shard",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddConstraint(
+            model_name="salesrollup",
+            constraint=models.UniqueConstraint(
+                fields=("day", "subcategory", "brand", "shard"),
+                name="salesrollup_unique_day_subcategory_brand_shard",
+            ),
+        ),
+    ]
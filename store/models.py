@@ -41,6 +41,16 @@ class Product(models.Model):
     image = models.ImageField(upload_to='product_images/')
     brand = models.CharField(max_length=255)
     slug = models.SlugField(unique=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    # Resized copies of ``image``: {'source': image name, 'files': {variant: {format: name}}}
+    image_variants = models.JSONField(default=dict, blank=True)
+
+    class Meta:
+        indexes = [
+            # Filtered listings and facet counts stay inside these indexes
+            models.Index(fields=['subcategory', 'price'], name='product_subcategory_price'),
+            models.Index(fields=['brand', 'price'], name='product_brand_price'),
+        ]
 
     def __str__(self):
         return self.name
@@ -58,25 +68,133 @@ class CartItem(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
 
+    class Meta:
+        constraints = [
+            # One line per product, so cart mutations can upsert and update in place
+            models.UniqueConstraint(fields=['cart', 'product'], name='cartitem_unique_cart_product'),
+        ]
+
     def total_price(self):
         return self.product.price * self.quantity
 
 class Order(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Order history pages are index range scans, newest first
+            models.Index(fields=['user', 'created_at', 'id'], name='order_user_created_id'),
+            # Incremental feeds read the orders created in a time window
+            models.Index(fields=['created_at'], name='order_created'),
+        ]
 
     def __str__(self):
         return f"Order {self.id} - User {self.user.username}"
 
     def total_price(self):
-        items = self.items.all()
-        total = sum(item.product.price * item.quantity for item in items)
-        return total
+        return self.total
 
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField()
+    # Price at checkout time, so later catalog price changes don't rewrite history
+    unit_price = models.DecimalField(max_digits=8, decimal_places=2)
+
+    def __str__(self):
+        return f"Order Item {self.id} - Order {self.order.id}"
+
+    def total_price(self):
+        return self.unit_price * self.quantity
+
+class OrderExport(models.Model):
+    # Watermark of an incremental export feed: it has delivered every order created before exported_until
+    name = models.CharField(max_length=100, unique=True)
+    exported_until = models.DateTimeField(null=True, blank=True)
+    # The id watermark of feeds last run before exported_until existed
+    last_order_id = models.BigIntegerField(default=0)
+    exported_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Order export {self.name} - up to {self.exported_until or f'order {self.last_order_id}'}"
+
+class RelatedProductsState(models.Model):
+    # A single row: the related lists count every order created before counted_until
+    counted_until = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Related products counted until {self.counted_until}"
+
+class SalesRollup(models.Model):
+    # Units and revenue sold per day, subcategory and brand, kept current by checkout
+    day = models.DateField()
+    subcategory = models.ForeignKey(Subcategory, on_delete=models.CASCADE)
+    brand = models.CharField(max_length=255)
+    # Checkouts add to a random one of several rows per key, so a hot product's sales lock different rows
+    shard = models.PositiveSmallIntegerField(default=0)
+    units = models.PositiveBigIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            # Also the index behind day-range reports
+            models.UniqueConstraint(
+                fields=['day', 'subcategory', 'brand', 'shard'], name='salesrollup_unique_day_subcategory_brand_shard',
+            ),
+        ]
+
+    def __str__(self):
+        return f"Sales {self.day} - {self.subcategory} / {self.brand}"
+
+class RelatedProduct(models.Model):
+    # One entry of a product's "frequently bought together" list, ranked from 1
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField()
+    # Orders that contained both products
+    orders = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            # Also the index that serves a product's whole list in one range read
+            models.UniqueConstraint(fields=['product', 'rank'], name='relatedproduct_unique_product_rank'),
+        ]
+
+    def __str__(self):
+        return f"Related product {self.related_id} of {self.product_id} (#{self.rank})"
+
+class StockShard(models.Model):
+    # A product's unreserved stock, split over one or more rows so concurrent reservations
+    # of a hot product lock different rows; products without shards are not stock-tracked
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_shards')
+    shard = models.PositiveSmallIntegerField()
+    available = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'shard'], name='stockshard_unique_product_shard'),
+        ]
+
+    def __str__(self):
+        return f"Stock of {self.product_id} shard {self.shard}: {self.available}"
+
+class Reservation(models.Model):
+    # Stock taken from a shard for a cart line, until checkout consumes it or it expires
+    cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='reservations')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    shard = models.PositiveSmallIntegerField()
+    quantity = models.PositiveIntegerField(default=0)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cart', 'product', 'shard'], name='reservation_unique_cart_product_shard'),
+        ]
 
     def __str__(self):
-        return f"Order Item {self.id} - Order {self.order.id}"
\ No newline at end of file
+        return f"Reservation of {self.quantity} x {self.product_id} for cart {self.cart_id}"
@@ -0,0 +1,96 @@
+"""
+The category tree with per-node product counts, held in process memory.
+
+Each worker keeps one snapshot of the tree, already encoded as JSON, and
+serves navigation from it without touching the database. The snapshot is
+tagged with the tree version from the shared cache; saving or deleting a
+category, subcategory or product bumps that version (see signals.py), and
+every worker rebuilds its snapshot on its next read. Workers build theirs
+at startup, from wsgi.py and asgi.py.
+"""
+import json
+import logging
+import threading
+
+from asgiref.sync import sync_to_async
+from django.db import DatabaseError
+from django.db.models import Count
+
+from .cache import aget_version, bump_version, get_version
+from .models import Category, Product, Subcategory
+
+logger = logging.getLogger(__name__)
+
+TREE_VERSION_KEY = 'categories:version'
+
+CATEGORY_LABELS = dict(Category.CATEGORY_CHOICES)
+SUBCATEGORY_LABELS = dict(Subcategory.SUBCATEGORY_CHOICES)
+
+# (version, encoded tree) of the last snapshot this process built
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+def bump_tree_version():
+    return bump_version(TREE_VERSION_KEY)
+
+
+def build_category_tree():
+    """Every category with its subcategories and product counts, read in two queries."""
+    counts = dict(
+        Product.objects.values('subcategory_id').annotate(count=Count('id')).order_by().values_list('subcategory_id', 'count')
+    )
+    tree = {}
+    rows = Category.objects.values('id', 'name', 'subcategory__id', 'subcategory__name').order_by('id', 'subcategory__id')
+    for row in rows:
+        node = tree.setdefault(row['id'], {
+            'id': row['id'],
+            'name': row['name'],
+            'label': CATEGORY_LABELS.get(row['name'], row['name']),
+            'product_count': 0,
+            'subcategories': [],
+        })
+        if row['subcategory__id'] is None:
+            continue
+        count = counts.get(row['subcategory__id'], 0)
+        node['product_count'] += count
+        node['subcategories'].append({
+            'id': row['subcategory__id'],
+            'name': row['subcategory__name'],
+            'label': SUBCATEGORY_LABELS.get(row['subcategory__name'], row['subcategory__name']),
+            'product_count': count,
+        })
+    return list(tree.values())
+
+
+def _snapshot_for(version):
+    global _snapshot
+    snapshot = _snapshot
+    if snapshot is None or snapshot[0] != version:
+        # One thread rebuilds; the others wait for its snapshot instead of querying too
+        with _snapshot_lock:
+            snapshot = _snapshot
+            if snapshot is None or snapshot[0] != version:
+                snapshot = _snapshot = (version, json.dumps(build_category_tree()).encode())
+    return snapshot[1]
+
+
+def category_tree_json():
+    """The encoded tree for the current version: one cache read, and a rebuild only after a change."""
+    return _snapshot_for(get_version(TREE_VERSION_KEY))
+
+
+async def acategory_tree_json():
+    version = await aget_version(TREE_VERSION_KEY)
+    snapshot = _snapshot
+    if snapshot is not None and snapshot[0] == version:
+        return snapshot[1]
+    return await sync_to_async(_snapshot_for)(version)
+
+
+def warm_category_tree():
+    try:
+        category_tree_json()
+    except DatabaseError as e:
+        # E.g. a worker started before migrate: the first request builds the tree instead
+        logger.warning('Could not build the category tree at startup: %s', e)
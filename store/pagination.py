@@ -0,0 +1,156 @@
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.utils.dateparse import parse_datetime
+
+
+class PaginationError(ValueError):
+    pass
+
+
+def encode_cursor(*values):
+    # Cursors are opaque to clients: a url-safe base64 of the last row's key
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise PaginationError('Invalid cursor.')
+    if not isinstance(values, list) or not values:
+        raise PaginationError('Invalid cursor.')
+    return values
+
+
+def get_page_size(request):
+    page_size = request.GET.get('page_size')
+    if page_size is None:
+        return settings.STORE_PAGE_SIZE
+    try:
+        page_size = int(page_size)
+    except ValueError:
+        raise PaginationError('page_size must be a positive integer.')
+    if page_size < 1:
+        raise PaginationError('page_size must be a positive integer.')
+    return min(page_size, settings.STORE_MAX_PAGE_SIZE)
+
+
+def _id_cursor(cursor):
+    last_id = decode_cursor(cursor)[0]
+    if not isinstance(last_id, int):
+        raise PaginationError('Invalid cursor.')
+    return last_id
+
+
+def _newest_first_cursor(cursor):
+    values = decode_cursor(cursor)
+    try:
+        created_at = parse_datetime(values[0]) if len(values) == 2 and isinstance(values[0], str) else None
+    except ValueError:
+        # Well formed but not a real moment, e.g. February 30th
+        created_at = None
+    if created_at is None or not isinstance(values[1], int):
+        raise PaginationError('Invalid cursor.')
+    return created_at, values[1]
+
+
+def parse_id_page(request):
+    """The ``(cursor, page_size)`` of a page ordered by id, checked before any query runs."""
+    cursor = request.GET.get('cursor')
+    if cursor:
+        _id_cursor(cursor)
+    return cursor, get_page_size(request)
+
+
+def parse_newest_first_page(request):
+    """The ``(cursor, page_size)`` of a page ordered newest first, checked before any query runs."""
+    cursor = request.GET.get('cursor')
+    if cursor:
+        _newest_first_cursor(cursor)
+    return cursor, get_page_size(request)
+
+
+def _id_page(queryset, cursor, page_size):
+    if cursor:
+        queryset = queryset.filter(id__gt=_id_cursor(cursor))
+    # Fetch one extra row to know whether another page exists
+    return queryset.order_by('id')[:page_size + 1]
+
+
+def _split_page(rows, page_size):
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        return rows, encode_cursor(rows[-1]['id'])
+    return rows, None
+
+
+def paginate_by_id(queryset, cursor, page_size):
+    """
+    Return one keyset page of ``queryset.values()`` rows ordered by id,
+    along with the cursor for the next page (None on the last page).
+    """
+    return _split_page(list(_id_page(queryset, cursor, page_size)), page_size)
+
+
+async def apaginate_by_id(queryset, cursor, page_size):
+    return _split_page([row async for row in _id_page(queryset, cursor, page_size)], page_size)
+
+
+def _newest_first_page(queryset, cursor, page_size):
+    if cursor:
+        created_at, last_id = _newest_first_cursor(cursor)
+        # A range on created_at the index can seek to; only rows sharing the boundary timestamp are filtered
+        queryset = queryset.filter(created_at__lte=created_at).exclude(created_at=created_at, id__gte=last_id)
+    return queryset.order_by('-created_at', '-id')[:page_size + 1]
+
+
+def _split_newest_first(rows, page_size):
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        return rows, encode_cursor(rows[-1].created_at.isoformat(), rows[-1].id)
+    return rows, None
+
+
+def paginate_newest_first(queryset, cursor, page_size):
+    """
+    Return one keyset page of ``queryset`` ordered by (created_at, id)
+    descending, along with the cursor for the next page (None on the last
+    page). Any page costs the same as the first.
+    """
+    return _split_newest_first(list(_newest_first_page(queryset, cursor, page_size)), page_size)
+
+
+async def apaginate_newest_first(queryset, cursor, page_size):
+    return _split_newest_first([row async for row in _newest_first_page(queryset, cursor, page_size)], page_size)
+
+
+def iterate_by_id(queryset, chunk_size):
+    """
+    Yield every ``queryset.values()`` row ordered by id, one keyset chunk at a
+    time, so only ``chunk_size`` rows are ever held in memory.
+    """
+    last_id = None
+    while True:
+        chunk = queryset if last_id is None else queryset.filter(id__gt=last_id)
+        rows = list(chunk.order_by('id')[:chunk_size])
+        yield from rows
+        if len(rows) < chunk_size:
+            return
+        last_id = rows[-1]['id']
+
+
+async def aiterate_by_id(queryset, chunk_size):
+    last_id = None
+    while True:
+        chunk = queryset if last_id is None else queryset.filter(id__gt=last_id)
+        rows = [row async for row in chunk.order_by('id')[:chunk_size]]
+        for row in rows:
+            yield row
+        if len(rows) < chunk_size:
+            return
+        last_id = rows[-1]['id']
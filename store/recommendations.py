@@ -0,0 +1,163 @@
+"""
+"Frequently bought together": for each product, the products sharing the
+most orders with it, counted offline from the order lines and stored as a
+short ranked list per product.
+
+Order lines are read in windows of order ids, so each window holds whole
+baskets and is dropped once counted. The counters of the products being
+ranked are the only state that grows; splitting the products into
+``partitions`` passes divides that peak by as many full reads.
+"""
+import collections
+import heapq
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Min
+
+from .exports import settled_cutoff
+from .models import Order, OrderItem, RelatedProduct, RelatedProductsState
+from .serialization import LIST_IMAGE_VARIANTS, serialize_product_row
+
+WRITE_BATCH = 500
+
+
+def order_baskets(after, upto, chunk_size, anchors=None):
+    """
+    Yield the set of products of each order in the id window ``(after, upto]``,
+    or with ``anchors`` only of the orders holding one of those products.
+    """
+    start = after
+    while start < upto:
+        stop = min(start + chunk_size, upto)
+        lines = OrderItem.objects.filter(order_id__gt=start, order_id__lte=stop)
+        if anchors is not None:
+            lines = lines.filter(order_id__in=lines.filter(product_id__in=anchors).values('order_id'))
+        baskets = collections.defaultdict(set)
+        for order_id, product_id in lines.values_list('order_id', 'product_id'):
+            baskets[order_id].add(product_id)
+        yield from baskets.values()
+        start = stop
+
+
+def co_occurrence(baskets, is_anchor):
+    """Count, for every product passing ``is_anchor``, the orders it shares with each other product."""
+    counts = collections.defaultdict(collections.Counter)
+    for basket in baskets:
+        for product_id in basket:
+            if is_anchor(product_id):
+                # Touch the counter even for lone items, so their stale lists get cleared
+                counter = counts[product_id]
+                for other in basket:
+                    if other != product_id:
+                        counter[other] += 1
+    return counts
+
+
+def top_related(counter, top_k):
+    # Most shared orders first; ties go to the older product so reruns rank identically
+    return heapq.nlargest(top_k, counter.items(), key=lambda item: (item[1], -item[0]))
+
+
+def write_related(counts, top_k):
+    """Replace the stored lists of the products in ``counts``."""
+    product_ids = sorted(counts)
+    for offset in range(0, len(product_ids), WRITE_BATCH):
+        batch = product_ids[offset:offset + WRITE_BATCH]
+        with transaction.atomic():
+            RelatedProduct.objects.filter(product_id__in=batch).delete()
+            RelatedProduct.objects.bulk_create([
+                RelatedProduct(product_id=product_id, related_id=related_id, rank=rank, orders=orders)
+                for product_id in batch
+                for rank, (related_id, orders) in enumerate(top_related(counts[product_id], top_k), 1)
+            ])
+
+
+def _order_bounds():
+    bounds = Order.objects.aggregate(oldest=Min('id'), newest=Max('id'))
+    return (bounds['oldest'] or 1) - 1, bounds['newest'] or 0
+
+
+def _counted_until():
+    return RelatedProductsState.objects.filter(pk=1).values_list('counted_until', flat=True).first()
+
+
+def _save_counted_until(until):
+    RelatedProductsState.objects.update_or_create(pk=1, defaults={'counted_until': until})
+
+
+def rebuild_related_products(top_k=None, partitions=1, chunk_size=10000):
+    """
+    Recompute every product's list from the whole order history, in
+    ``partitions`` passes over it. Returns how many products were ranked.
+    """
+    top_k = top_k or settings.STORE_RELATED_PRODUCTS
+    # Orders still committing below the cutoff are left to the next refresh
+    until = settled_cutoff()
+    oldest, upto = _order_bounds()
+    ranked = set()
+    for part in range(partitions):
+        counts = co_occurrence(
+            order_baskets(oldest, upto, chunk_size), lambda product_id: product_id % partitions == part,
+        )
+        write_related(counts, top_k)
+        ranked.update(counts)
+        del counts
+
+    # Products whose orders are all gone keep no list
+    stale = sorted(set(RelatedProduct.objects.values_list('product_id', flat=True).distinct()) - ranked)
+    for offset in range(0, len(stale), WRITE_BATCH):
+        RelatedProduct.objects.filter(product_id__in=stale[offset:offset + WRITE_BATCH]).delete()
+    _save_counted_until(until)
+    return len(ranked)
+
+
+def refresh_related_products(top_k=None, partitions=1, chunk_size=10000):
+    """
+    Re-rank only the products bought since the last build or refresh; every
+    other product's counts are unchanged. Their full histories are recounted,
+    reading only the orders that hold one of them. Returns how many products
+    were re-ranked.
+
+    "Since" goes by order creation time, up to STORE_ORDER_SETTLE_SECONDS
+    ago, so an order whose checkout commits within that delay is picked up
+    even when a newer order committed first.
+    """
+    top_k = top_k or settings.STORE_RELATED_PRODUCTS
+    since, until = _counted_until(), settled_cutoff()
+    lines = OrderItem.objects.filter(order__created_at__lt=until)
+    if since is not None:
+        lines = lines.filter(order__created_at__gte=since)
+        until = max(since, until)
+    anchors = sorted(set(lines.values_list('product_id', flat=True)))
+    oldest, upto = _order_bounds()
+    for part in range(partitions):
+        part_anchors = anchors[part::partitions]
+        if not part_anchors:
+            continue
+        members = set(part_anchors)
+        counts = co_occurrence(order_baskets(oldest, upto, chunk_size, part_anchors), members.__contains__)
+        write_related(counts, top_k)
+        del counts
+    _save_counted_until(until)
+    return len(anchors)
+
+
+def related_products(product_id):
+    """The stored list of ``product_id`` in rank order, read in one indexed range scan."""
+    return RelatedProduct.objects.filter(product_id=product_id).order_by('rank').values(
+        'related_id', 'related__name', 'related__brand', 'related__price', 'related__image_variants', 'orders',
+    )
+
+
+def serialize_related(rows):
+    return [
+        dict(serialize_product_row({
+            'id': row['related_id'],
+            'name': row['related__name'],
+            'brand': row['related__brand'],
+            'price': row['related__price'],
+            'image_variants': row['related__image_variants'],
+        }, LIST_IMAGE_VARIANTS), orders=row['orders'])
+        for row in rows
+    ]
@@ -0,0 +1,97 @@
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import Product
+from .serialization import LIST_IMAGE_VARIANTS, serialize_product_row
+
+SEARCH_TABLE = 'store_product_search'
+
+TOKEN_RE = re.compile(r'\w+')
+
+# bm25 column weights for the SQLite index: name, brand, description
+SQLITE_WEIGHTS = (3.0, 2.0, 1.0)
+
+
+def tokenize(query):
+    return TOKEN_RE.findall(query.lower())
+
+
+def search_products(query, limit):
+    """
+    Return ``(product_id, score)`` pairs matching every term of ``query``,
+    best match first. The last term is treated as a prefix.
+
+    MySQL answers from the FULLTEXT index on (name, brand, description) and
+    SQLite from an FTS5 table kept in sync by the Product signals; other
+    backends fall back to an unranked substring search.
+    """
+    terms = tokenize(query)
+    if not terms:
+        return []
+    if connection.vendor == 'sqlite':
+        return _search_sqlite(terms, limit)
+    if connection.vendor == 'mysql':
+        return _search_mysql(terms, limit)
+    return _search_fallback(terms, limit)
+
+
+def _search_sqlite(terms, limit):
+    match = ' '.join(f'"{term}"' for term in terms) + '*'
+    sql = (
+        f'SELECT rowid, -bm25({SEARCH_TABLE}, %s, %s, %s) AS score FROM {SEARCH_TABLE} '
+        f'WHERE {SEARCH_TABLE} MATCH %s ORDER BY score DESC LIMIT %s'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [*SQLITE_WEIGHTS, match, limit])
+        return cursor.fetchall()
+
+
+def _search_mysql(terms, limit):
+    against = ' '.join(f'+{term}' for term in terms) + '*'
+    sql = (
+        'SELECT id, MATCH(name, brand, description) AGAINST (%s IN BOOLEAN MODE) AS score '
+        'FROM store_product WHERE MATCH(name, brand, description) AGAINST (%s IN BOOLEAN MODE) '
+        'ORDER BY score DESC LIMIT %s'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [against, against, limit])
+        return cursor.fetchall()
+
+
+def _search_fallback(terms, limit):
+    products = Product.objects.all()
+    for term in terms:
+        products = products.filter(Q(name__icontains=term) | Q(brand__icontains=term) | Q(description__icontains=term))
+    return [(product_id, 0.0) for product_id in products.order_by('id').values_list('id', flat=True)[:limit]]
+
+
+def search_product_payload(query, limit):
+    hits = search_products(query, limit)
+    rows = Product.objects.filter(pk__in=[product_id for product_id, score in hits]).values(
+        'id', 'name', 'brand', 'price', 'image_variants',
+    )
+    products = {row['id']: serialize_product_row(row, LIST_IMAGE_VARIANTS) for row in rows}
+    # Keep the ranking order; ids deleted since they were indexed drop out
+    return [dict(products[product_id], score=score) for product_id, score in hits if product_id in products]
+
+
+def index_products(products):
+    """
+    Write ``products`` into the SQLite search table. MySQL maintains its
+    FULLTEXT index itself, so this is a no-op there.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    rows = [(product.id, product.name, product.brand, product.description) for product in products]
+    with connection.cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [(row[0],) for row in rows])
+        cursor.executemany(f'INSERT INTO {SEARCH_TABLE} (rowid, name, brand, description) VALUES (%s, %s, %s, %s)', rows)
+
+
+def unindex_products(product_ids):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [(product_id,) for product_id in product_ids])
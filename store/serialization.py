@@ -0,0 +1,132 @@
+from django.db.models import F, Prefetch
+
+from .images import image_urls
+from .models import CartItem, Order, OrderItem
+
+# Public product fields and the columns each one is read from
+PRODUCT_FIELDS = {
+    'id': 'id',
+    'name': 'name',
+    'slug': 'slug',
+    'brand': 'brand',
+    'price': 'price',
+    'description': 'description',
+    'subcategory': 'subcategory_id',
+    'updated_at': 'updated_at',
+    'images': 'image_variants',
+}
+
+# Related rows ``?expand=`` nests in a product, read through joins in the same query
+PRODUCT_EXPANSIONS = {
+    'subcategory': {'id': 'subcategory_id', 'name': 'subcategory__name'},
+    'category': {'id': 'subcategory__category_id', 'name': 'subcategory__category__name'},
+}
+
+PRODUCT_LIST_FIELDS = ('id', 'name', 'images')
+
+PRODUCT_DETAIL_FIELDS = ('id', 'name', 'price', 'images')
+
+# Listings only need thumbnails; the detail payload carries every variant
+LIST_IMAGE_VARIANTS = ('thumb',)
+
+
+class FieldsError(ValueError):
+    pass
+
+
+def _names(value, allowed, param):
+    names = list(dict.fromkeys(name for name in value.split(',') if name))
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise FieldsError(f"{param} accepts {', '.join(allowed)}; got {', '.join(unknown)}.")
+    return tuple(names)
+
+
+def parse_product_fields(params, default):
+    """
+    Read ``fields`` (a comma list of PRODUCT_FIELDS, ``default`` when absent)
+    and ``expand`` (a comma list of PRODUCT_EXPANSIONS). Returns both as tuples.
+    """
+    fields = _names(params['fields'], PRODUCT_FIELDS, 'fields') if params.get('fields') else default
+    expand = _names(params.get('expand', ''), PRODUCT_EXPANSIONS, 'expand')
+    return fields, expand
+
+
+def product_values(queryset, fields, expand=()):
+    """
+    Project ``queryset`` onto the columns behind ``fields`` and ``expand``,
+    plus the id that keyset pagination needs. The rows are plain dicts.
+    """
+    columns = ['id'] + [PRODUCT_FIELDS[field] for field in fields]
+    columns += [column for name in expand for column in PRODUCT_EXPANSIONS[name].values()]
+    return queryset.values(*dict.fromkeys(columns))
+
+
+def serialize_product(row, fields, expand=(), variants=None):
+    data = {}
+    for field in fields:
+        if field == 'images':
+            data['images'] = image_urls(row['image_variants'], variants)
+        else:
+            data[field] = row[PRODUCT_FIELDS[field]]
+    for name in expand:
+        data[name] = {key: row[column] for key, column in PRODUCT_EXPANSIONS[name].items()}
+    return data
+
+
+async def aserialize_products(rows, fields, expand=(), variants=None):
+    async for row in rows:
+        yield serialize_product(row, fields, expand, variants)
+
+
+def serialize_product_row(row, variants=None):
+    # Swap the stored variant file names for their URLs
+    row = dict(row)
+    row['images'] = image_urls(row.pop('image_variants'), variants)
+    return row
+
+
+def cart_rows(user):
+    # One joined query returns every line with its product, price and line total
+    return CartItem.objects.filter(cart__user=user).annotate(
+        line_total=F('quantity') * F('product__price'),
+    ).values('id', 'product_id', 'product__name', 'product__price', 'quantity', 'line_total').order_by('id')
+
+
+def serialize_cart(rows):
+    items = [
+        {
+            'id': row['id'],
+            'product_id': row['product_id'],
+            'product': row['product__name'],
+            'unit_price': row['product__price'],
+            'quantity': row['quantity'],
+            'line_total': row['line_total'],
+        }
+        for row in rows
+    ]
+    return {'items': items, 'subtotal': sum(item['line_total'] for item in items)}
+
+
+def user_orders(user, since=None, until=None):
+    # Totals are stored on the order; items are fetched in one batched query
+    orders = Order.objects.filter(user=user)
+    if since is not None:
+        orders = orders.filter(created_at__gte=since)
+    if until is not None:
+        orders = orders.filter(created_at__lt=until)
+    return orders.prefetch_related(
+        Prefetch('items', queryset=OrderItem.objects.select_related('product').only('order_id', 'quantity', 'unit_price', 'product__name')),
+    )
+
+
+def serialize_order(order):
+    return {
+        'order_id': order.id,
+        'subtotal': order.subtotal,
+        'total_price': order.total,
+        'items': [
+            {'product': item.product.name, 'quantity': item.quantity, 'unit_price': item.unit_price}
+            for item in order.items.all()
+        ]
+    }
@@ -0,0 +1,137 @@
+"""
+Cached sessions persisted write-behind to the database.
+
+The cache is read and written first, as with Django's cached_db engine, but
+saves that leave the data unchanged write nothing, and the database copy of a
+session is written at most once per STORE_SESSION_WRITE_DELAY seconds: later
+saves inside that window only replace the pending data. Pending writes are
+flushed after a request finishes once they are due, and at process exit.
+
+Sessions are only as durable as the cache for up to that delay, and other
+workers only see the cached copy, so point the session cache at a backend
+every worker shares (Redis or Memcached), or set the delay to 0.
+"""
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.sessions.backends.base import UpdateError
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+from django.db import DatabaseError
+
+logger = logging.getLogger(__name__)
+
+# session key -> (deadline, data) of the database writes not yet made
+_pending = {}
+_pending_lock = threading.Lock()
+
+
+class SessionStore(CachedDBStore):
+    cache_key_prefix = 'store.sessions'
+
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        # Serialized data as last loaded or saved, None until then
+        self._saved = None
+
+    def _fingerprint(self, data):
+        return self.serializer().dumps(data)
+
+    def load(self):
+        with _pending_lock:
+            pending = _pending.get(self.session_key)
+        if pending is not None and self._cache.get(self.cache_key) is None:
+            # The cache evicted a session whose newest data is still waiting for its write
+            data = pending[1]
+            self._cache.set(self.cache_key, data, self.get_expiry_age(expiry=data.get('_session_expiry')))
+        data = super().load()
+        self._saved = self._fingerprint(data)
+        return data
+
+    def save(self, must_create=False):
+        if self.session_key is None or must_create:
+            # New keys are inserted right away: the database guarantees they are unique
+            super().save(must_create)
+            self._saved = self._fingerprint(self._session)
+            return
+        data = self._get_session()
+        fingerprint = self._fingerprint(data)
+        if fingerprint == self._saved:
+            return
+        if settings.STORE_SESSION_WRITE_DELAY <= 0:
+            super().save()
+        else:
+            self._cache.set(self.cache_key, data, self.get_expiry_age())
+            schedule_write(self.session_key, data)
+        self._saved = fingerprint
+
+    def delete(self, session_key=None):
+        with _pending_lock:
+            _pending.pop(session_key or self.session_key, None)
+        super().delete(session_key)
+
+
+def schedule_write(session_key, data):
+    # A write landing while another is pending replaces its data but keeps its deadline
+    with _pending_lock:
+        deadline = _pending[session_key][0] if session_key in _pending else None
+        if deadline is None:
+            deadline = time.monotonic() + settings.STORE_SESSION_WRITE_DELAY
+        _pending[session_key] = (deadline, data)
+
+
+def pending_writes():
+    with _pending_lock:
+        return len(_pending)
+
+
+def _persist(session_key, data):
+    store = SessionStore(session_key)
+    # The cache holds the newest data of every worker; ours is the fallback if it was evicted
+    cached = store._cache.get(store.cache_key)
+    store._session_cache = data if cached is None else cached
+    try:
+        DBStore.save(store)
+    except UpdateError:
+        # The session was deleted meanwhile, by a logout or clearsessions
+        return False
+    return True
+
+
+def _requeue(session_key, data):
+    # A save made meanwhile queued fresher data; otherwise retry after another delay
+    with _pending_lock:
+        _pending.setdefault(session_key, (time.monotonic() + settings.STORE_SESSION_WRITE_DELAY, data))
+
+
+def flush_sessions(due_only=False):
+    """
+    Write the pending sessions to the database, or only those whose delay
+    has passed with ``due_only``. Returns how many rows were written.
+
+    A write the database refuses is logged and queued again, so one failure
+    neither loses the other writes nor escapes into the response cycle.
+    """
+    now = time.monotonic()
+    with _pending_lock:
+        keys = [key for key, (deadline, data) in _pending.items() if not due_only or deadline <= now]
+        writes = [(key, _pending.pop(key)[1]) for key in keys]
+    written = 0
+    for key, data in writes:
+        try:
+            written += _persist(key, data)
+        except DatabaseError as e:
+            logger.warning('Could not write session %s, retrying later: %s', key[:8], e)
+            _requeue(key, data)
+    return written
+
+
+@atexit.register
+def _flush_at_exit():
+    flush_sessions()
+    count = pending_writes()
+    if count:
+        logger.warning('Could not write %s pending sessions at exit.', count)
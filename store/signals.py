@@ -0,0 +1,54 @@
+from django.core.signals import request_finished
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import bump_catalog_version
+from .images import needs_variants, schedule_product_images
+from .instrumentation import install_query_recorder
+from .models import Category, Product, Subcategory
+from .navigation import bump_tree_version
+from .search import index_products, unindex_products
+from .sessions import flush_sessions
+
+
+@receiver([post_save, post_delete], sender=Product)
+def invalidate_catalog_cache(sender, **kwargs):
+    # Bump after commit so no worker re-caches the pre-change rows under the new version
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver([post_save, post_delete], sender=Category)
+@receiver([post_save, post_delete], sender=Subcategory)
+@receiver([post_save, post_delete], sender=Product)
+def invalidate_category_tree(sender, **kwargs):
+    # Every worker rebuilds its in-memory tree on its next read
+    transaction.on_commit(bump_tree_version)
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, **kwargs):
+    index_products([instance])
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    unindex_products([instance.id])
+
+
+@receiver(post_save, sender=Product)
+def build_product_images(sender, instance, **kwargs):
+    if needs_variants(instance):
+        transaction.on_commit(lambda: schedule_product_images([instance.id]))
+
+
+@receiver(connection_created)
+def record_connection_queries(sender, connection, **kwargs):
+    install_query_recorder(connection)
+
+
+@receiver(request_finished)
+def flush_due_sessions(sender, **kwargs):
+    # Runs once the response is sent, so the deferred session writes stay off the request path
+    flush_sessions(due_only=True)
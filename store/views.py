@@ -1,53 +1,204 @@
 from django.shortcuts import get_object_or_404, redirect
 from django.views import View
-from django.http import JsonResponse
+from django.http import Http404, HttpResponse, JsonResponse, QueryDict, StreamingHttpResponse
 from django.contrib.auth import authenticate, login, logout
-from django.contrib.auth.mixins import LoginRequiredMixin
+from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib.auth.views import PasswordResetView, PasswordChangeView
 from django.urls import reverse_lazy
 from django.contrib.auth.models import User
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError
-from .models import Product, Order, OrderItem, Cart, CartItem
+from .models import Product, Subcategory, Order, OrderItem, Cart, CartItem
 from django.contrib import messages
-from django.views.decorators.csrf import csrf_protect
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from django.utils.decorators import method_decorator
+from django.conf import settings
+import json
+from django.db import connection, transaction
+from django.db.models import F
+from .analytics import AnalyticsError, parse_report_params, record_order_sales, sales_report
+from .cache import get_cart_payload, get_catalog_payload, get_catalog_payloads, invalidate_cart
+from .catalog import (
+    FilterError, filter_products, parse_product_filters, product_cache_key, product_facets, product_list_cache_key,
+)
+from .exports import EXPORT_CONTENT_TYPES, ExportError, export_orders, parse_moment
+from .instrumentation import request_stats
+from .navigation import category_tree_json
+from .inventory import OutOfStock, consume_reservations, hold, release, reserve
+from .http import COLLECTION_VALIDATORS, cache_key, collection_etag, json_array_stream, make_etag, not_modified, set_validators
+from .search import search_product_payload, tokenize
+from .serialization import (
+    LIST_IMAGE_VARIANTS, PRODUCT_DETAIL_FIELDS, PRODUCT_LIST_FIELDS, FieldsError, cart_rows, parse_product_fields,
+    product_values, serialize_cart, serialize_order, serialize_product, user_orders,
+)
+from .recommendations import related_products, serialize_related
+from .pagination import (
+    PaginationError, get_page_size, iterate_by_id, paginate_by_id, paginate_newest_first, parse_id_page,
+    parse_newest_first_page,
+)
+
+class StaffRequiredMixin(LoginRequiredMixin, UserPassesTestMixin):
+    def test_func(self):
+        return self.request.user.is_staff
 
 ###########################Product action views######################
+def _collection_validators(queryset, request):
+    # One aggregate query stands in for the whole payload
+    stats = queryset.aggregate(**COLLECTION_VALIDATORS)
+    return collection_etag(stats, request), stats['last_modified']
+
 class ProductListView(View):
     def get(self, request):
-        products = Product.objects.all()
-        data = [{'id': product.id, 'name': product.name} for product in products]
-        return JsonResponse(data, safe=False)
+        # A malformed request is rejected before it can be answered with a 304
+        try:
+            filters = parse_product_filters(request.GET)
+            fields, expand = parse_product_fields(request.GET, PRODUCT_LIST_FIELDS)
+            cursor, page_size = (None, None) if request.GET.get('stream') else parse_id_page(request)
+        except (FilterError, FieldsError, PaginationError) as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+        etag, last_modified = _collection_validators(Product.objects.all(), request)
+        response = not_modified(request, etag, last_modified)
+        if response is not None:
+            return response
+        response = self.build_response(request, filters, fields, expand, cursor, page_size)
+        return set_validators(response, etag, last_modified)
+
+    def build_response(self, request, filters, fields, expand, cursor, page_size):
+        # Only the requested columns are read, straight into dicts
+        products = filter_products(product_values(Product.objects.all(), fields, expand), filters)
+
+        # Full dump mode: stream the whole catalog with flat worker memory
+        if request.GET.get('stream'):
+            chunk_size = settings.STORE_STREAM_CHUNK_SIZE
+            rows = (serialize_product(row, fields, expand, LIST_IMAGE_VARIANTS) for row in iterate_by_id(products, chunk_size))
+            return StreamingHttpResponse(json_array_stream(rows, chunk_size), content_type='application/json')
+
+        def build():
+            results, next_cursor = paginate_by_id(products, cursor, page_size)
+            results = [serialize_product(row, fields, expand, LIST_IMAGE_VARIANTS) for row in results]
+            data = {'results': results, 'next_cursor': next_cursor}
+            # Facet counts describe the whole result set, so only the first page carries them
+            if not cursor:
+                data['facets'] = product_facets(filters)
+            return data
+
+        data = get_catalog_payload(product_list_cache_key(request.GET, cursor, page_size, fields, expand), build)
+        return JsonResponse(data)
 
 class ProductDetailView(View):
     def get(self, request, pk):
-        product = get_object_or_404(Product, pk=pk)
-        data = {'id': product.id, 'name': product.name, 'price': product.price}
-        return JsonResponse(data)
+        try:
+            fields, expand = parse_product_fields(request.GET, PRODUCT_DETAIL_FIELDS)
+        except FieldsError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        last_modified = Product.objects.filter(pk=pk).values_list('updated_at', flat=True).first()
+        etag = make_etag(pk, last_modified, *fields, *expand)
+        if last_modified is not None:
+            response = not_modified(request, etag, last_modified)
+            if response is not None:
+                return response
+
+        def build():
+            row = get_object_or_404(product_values(Product.objects.all(), fields, expand), pk=pk)
+            return serialize_product(row, fields, expand)
+
+        data = get_catalog_payload(product_cache_key(pk, fields, expand), build)
+        return set_validators(JsonResponse(data), etag, last_modified)
+
+def _parse_product_ids(ids):
+    if not isinstance(ids, list) or not ids:
+        raise ValueError('ids must be a non-empty list of product ids.')
+    if len(ids) > settings.STORE_PRODUCT_BATCH_MAX:
+        raise ValueError(f'A batch may hold at most {settings.STORE_PRODUCT_BATCH_MAX} ids.')
+    if any(type(pk) is not int or pk < 1 for pk in ids):
+        raise ValueError('ids must be positive integers.')
+    return list(dict.fromkeys(ids))
+
+# Reads only: the POST form just carries id lists too long for a URL
+@method_decorator(csrf_exempt, name='dispatch')
+class ProductBatchView(View):
+    def get(self, request):
+        ids = [int(pk) if pk.isdigit() else pk for pk in request.GET.get('ids', '').split(',') if pk]
+        return self.build_response(request, ids)
+
+    def post(self, request):
+        try:
+            ids = json.loads(request.body).get('ids')
+        except (ValueError, AttributeError):
+            return JsonResponse({'error': 'Body must be a JSON object with an ids list.'}, status=400)
+        return self.build_response(request, ids)
+
+    def build_response(self, request, ids):
+        try:
+            ids = _parse_product_ids(ids)
+            fields, expand = parse_product_fields(request.GET, PRODUCT_DETAIL_FIELDS)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+        # Products cached by the detail view are reused; the rest come from one id__in query
+        keys = {product_cache_key(pk, fields, expand): pk for pk in ids}
+
+        def build(missing):
+            rows = product_values(Product.objects.all(), fields, expand).filter(id__in=[keys[key] for key in missing])
+            return {product_cache_key(row['id'], fields, expand): serialize_product(row, fields, expand) for row in rows}
+
+        payloads = get_catalog_payloads(list(keys), build)
+        products = {keys[key]: payload for key, payload in payloads.items()}
+        return JsonResponse({
+            'results': [products[pk] for pk in ids if pk in products],
+            'missing': [pk for pk in ids if pk not in products],
+        })
+
+class ProductRelatedView(View):
+    def get(self, request, pk):
+        return JsonResponse({'product_id': pk, 'results': serialize_related(related_products(pk))})
+
+class ProductSearchView(View):
+    def get(self, request):
+        query = request.GET.get('q', '')
+        terms = tokenize(query)
+        if not terms:
+            return JsonResponse({'error': 'The q parameter is required.'}, status=400)
+
+        try:
+            limit = get_page_size(request)
+        except PaginationError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+        # Repeated searches are answered from the catalog cache
+        key = cache_key('search', limit, *terms)
+        results = get_catalog_payload(key, lambda: search_product_payload(query, limit))
+        return JsonResponse({'results': results})
 
 class ProductCreateView(View):
     def post(self, request):
-        data = request.POST or request.data
+        data = request.POST
 
         name = data.get('name')
         price = data.get('price')
+        subcategory_id = data.get('subcategory')
 
-        if not name or not price:
-            return JsonResponse({'error': 'Name and price are required fields.'}, status=400)
+        if not name or not price or not subcategory_id:
+            return JsonResponse({'error': 'Name, price and subcategory are required fields.'}, status=400)
 
         try:
             price = float(price)
         except ValueError:
             return JsonResponse({'error': 'Price must be a valid number.'}, status=400)
 
-        product = Product(name=name, price=price)
+        if not subcategory_id.isdigit() or not Subcategory.objects.filter(pk=subcategory_id).exists():
+            return JsonResponse({'error': 'Unknown subcategory.'}, status=400)
+
+        product = Product(name=name, price=price, subcategory_id=subcategory_id)
         product.save()
 
         return JsonResponse({'success': 'Product created successfully.'})
 
 class ProductUpdateView(View):
     def put(self, request, pk):
-        data = request.PUT or request.data
+        # Django only parses form bodies of POST requests
+        data = QueryDict(request.body)
 
         product = get_object_or_404(Product, pk=pk)
 
@@ -76,12 +227,17 @@ class ProductDeleteView(View):
         return JsonResponse({'success': 'Product deleted successfully.'})
 
 
+class CategoryTreeView(View):
+    def get(self, request):
+        # Served from this worker's snapshot, already encoded
+        return HttpResponse(category_tree_json(), content_type='application/json')
+
 ####################Customer action views###########################
 
 class UserRegistrationView(View):
-    @csrf_protect
+    @method_decorator(csrf_protect)
     def post(self, request):
-        data = request.POST or request.data
+        data = request.POST
 
         username = data.get('username')
         password = data.get('password')
@@ -108,9 +264,9 @@ class UserRegistrationView(View):
             return JsonResponse({'error': e.messages}, status=400)
 
 class UserLoginView(View):
-    @csrf_protect
+    @method_decorator(csrf_protect)
     def post(self, request):
-        data = request.POST or request.data
+        data = request.POST
 
         username = data.get('username')
         password = data.get('password')
@@ -128,7 +284,7 @@ class UserLoginView(View):
         return JsonResponse({'success': 'User logged in successfully.'})
 
 class UserLogoutView(LoginRequiredMixin, View):
-    @csrf_protect
+    @method_decorator(csrf_protect)
     def post(self, request):
         logout(request)
         return JsonResponse({'success': 'User logged out successfully.'})
@@ -148,114 +304,256 @@ class CustomPasswordChangeView(PasswordChangeView):
 
 ################################Cart Action views###############################
 
-class CartDetailView(View):
+class CartDetailView(LoginRequiredMixin, View):
     def get(self, request):
-        # Get the user's cart
-        cart, created = Cart.objects.get_or_create(user=request.user)
-        cart_items = cart.items.all()
-
-        # Serialize cart items
-        data = [{'id': item.id, 'product': item.product.name, 'quantity': item.quantity} for item in cart_items]
-        return JsonResponse(data, safe=False)
+        # Served from the per-user cache until a cart mutation invalidates it
+        data = get_cart_payload(request.user.id, lambda: serialize_cart(cart_rows(request.user)))
+        return JsonResponse(data)
 
-class AddToCartView(View):
-    def post(self, request, product_id):
-        # Get the product
-        product = get_object_or_404(Product, id=product_id)
+def _cart_id(user):
+    cart, created = Cart.objects.get_or_create(user=user)
+    return cart.id
 
-        # Get the user's cart
-        cart, created = Cart.objects.get_or_create(user=request.user)
+def _upsert_cart_items(items):
+    # Insert lines or overwrite the quantity of existing (cart, product) lines in one statement.
+    # MySQL always resolves conflicts on the unique key and rejects an explicit target.
+    unique_fields = ['cart', 'product'] if connection.features.supports_update_conflicts_with_target else None
+    CartItem.objects.bulk_create(items, update_conflicts=True, unique_fields=unique_fields, update_fields=['quantity'])
 
-        # Check if the product is already in the cart
-        cart_item, item_created = cart.items.get_or_create(product=product)
+def _out_of_stock(e):
+    return JsonResponse({'error': str(e), 'product_id': e.product_id, 'available': e.available}, status=409)
 
-        # Increase the quantity if the item already exists, or create a new item with quantity 1
-        if not item_created:
-            cart_item.quantity += 1
-            cart_item.save()
+class AddToCartView(LoginRequiredMixin, View):
+    def post(self, request, product_id):
+        # Get the user's cart
+        cart_id = _cart_id(request.user)
+        cart_item = CartItem.objects.filter(cart_id=cart_id, product_id=product_id)
 
+        try:
+            with transaction.atomic():
+                # Increase the quantity in SQL so concurrent adds can't overwrite each other
+                if not cart_item.update(quantity=F('quantity') + 1):
+                    if not Product.objects.filter(id=product_id).exists():
+                        raise Http404('No Product matches the given query.')
+                    # Insert the line at zero (a concurrent insert wins harmlessly), then count this add
+                    CartItem.objects.bulk_create([CartItem(cart_id=cart_id, product_id=product_id, quantity=0)], ignore_conflicts=True)
+                    cart_item.update(quantity=F('quantity') + 1)
+                # Hold the unit for this cart; a refusal rolls the add back
+                reserve(cart_id, product_id, 1)
+        except OutOfStock as e:
+            return _out_of_stock(e)
+
+        invalidate_cart(request.user.id)
         return JsonResponse({'success': 'Product added to cart successfully.'})
 
-class RemoveFromCartView(View):
+class RemoveFromCartView(LoginRequiredMixin, View):
     def post(self, request, product_id):
-        # Get the product
-        product = get_object_or_404(Product, id=product_id)
-
         # Get the user's cart
-        cart, created = Cart.objects.get_or_create(user=request.user)
-
-        # Check if the product is in the cart
-        cart_item = get_object_or_404(CartItem, cart=cart, product=product)
-
-        # Decrease the quantity or remove the item if the quantity becomes zero
-        if cart_item.quantity > 1:
-            cart_item.quantity -= 1
-            cart_item.save()
-        else:
-            cart_item.delete()
-
+        cart_id = _cart_id(request.user)
+        cart_item = CartItem.objects.filter(cart_id=cart_id, product_id=product_id)
+
+        with transaction.atomic():
+            # Decrease the quantity or remove the item if the quantity becomes zero
+            if not cart_item.filter(quantity__gt=1).update(quantity=F('quantity') - 1):
+                deleted, _ = cart_item.filter(quantity__lte=1).delete()
+                if not deleted:
+                    raise Http404('No CartItem matches the given query.')
+            # Give the unit back to stock
+            release(cart_id, product_id, 1)
+
+        invalidate_cart(request.user.id)
         return JsonResponse({'success': 'Product removed from cart successfully.'})
 
-class UpdateCartItemView(View):
+class UpdateCartItemView(LoginRequiredMixin, View):
     def post(self, request, product_id):
-        # Get the product
-        product = get_object_or_404(Product, id=product_id)
+        try:
+            quantity = int(request.POST.get('quantity', 0))
+        except ValueError:
+            return JsonResponse({'error': 'Quantity must be an integer.'}, status=400)
 
         # Get the user's cart
-        cart, created = Cart.objects.get_or_create(user=request.user)
+        cart_id = _cart_id(request.user)
+        cart_item = CartItem.objects.filter(cart_id=cart_id, product_id=product_id)
 
-        # Check if the product is in the cart
-        cart_item = get_object_or_404(CartItem, cart=cart, product=product)
+        try:
+            with transaction.atomic():
+                # Set the quantity or remove the line, in one statement either way
+                if quantity > 0:
+                    changed = cart_item.update(quantity=quantity)
+                else:
+                    changed, _ = cart_item.delete()
+                if not changed:
+                    raise Http404('No CartItem matches the given query.')
+                # Reserve or release the difference
+                hold(cart_id, {product_id: max(quantity, 0)})
+        except OutOfStock as e:
+            return _out_of_stock(e)
+
+        invalidate_cart(request.user.id)
+        return JsonResponse({'success': 'Cart item updated successfully.'})
 
-        # Update the quantity based on the request data
-        quantity = int(request.POST.get('quantity', 0))
-        if quantity > 0:
-            cart_item.quantity = quantity
-            cart_item.save()
-        else:
-            cart_item.delete()
+CART_OPERATIONS = ('add', 'remove', 'set')
+
+def _parse_cart_operations(body):
+    try:
+        operations = json.loads(body).get('operations')
+    except (ValueError, AttributeError):
+        raise ValueError('Body must be a JSON object with an operations list.')
+    if not isinstance(operations, list) or not operations:
+        raise ValueError('Body must be a JSON object with an operations list.')
+    if len(operations) > settings.STORE_CART_BATCH_MAX_OPERATIONS:
+        raise ValueError(f'A batch may hold at most {settings.STORE_CART_BATCH_MAX_OPERATIONS} operations.')
+
+    parsed = []
+    for index, operation in enumerate(operations):
+        if not isinstance(operation, dict) or operation.get('op') not in CART_OPERATIONS:
+            raise ValueError(f'Operation {index}: op must be one of {", ".join(CART_OPERATIONS)}.')
+        product_id = operation.get('product_id')
+        quantity = operation.get('quantity', 1)
+        if type(product_id) is not int or type(quantity) is not int or quantity < 0:
+            raise ValueError(f'Operation {index}: product_id and quantity must be non-negative integers.')
+        parsed.append((operation['op'], product_id, quantity))
+    return parsed
+
+class CartBatchView(LoginRequiredMixin, View):
+    def post(self, request):
+        try:
+            operations = _parse_cart_operations(request.body)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
 
-        return JsonResponse({'success': 'Cart item updated successfully.'})
+        # Validate every product id with a single query
+        product_ids = {product_id for op, product_id, quantity in operations}
+        missing = sorted(product_ids - Product.objects.only('id').in_bulk(product_ids).keys())
+        if missing:
+            return JsonResponse({'error': 'Unknown products.', 'missing': missing}, status=400)
+
+        try:
+            with transaction.atomic():
+                # Lock the cart and the affected lines, then apply the whole batch in memory
+                cart, created = Cart.objects.select_for_update().get_or_create(user=request.user)
+                quantities = dict(
+                    CartItem.objects.select_for_update().filter(cart=cart, product_id__in=product_ids).values_list('product_id', 'quantity')
+                )
+                for op, product_id, quantity in operations:
+                    current = quantities.get(product_id, 0)
+                    if op == 'add':
+                        quantities[product_id] = current + quantity
+                    elif op == 'remove':
+                        quantities[product_id] = max(current - quantity, 0)
+                    else:
+                        quantities[product_id] = quantity
+
+                # Write the result back with one upsert and one delete
+                kept = [CartItem(cart=cart, product_id=product_id, quantity=quantity) for product_id, quantity in quantities.items() if quantity > 0]
+                removed = [product_id for product_id, quantity in quantities.items() if quantity == 0]
+                if kept:
+                    _upsert_cart_items(kept)
+                if removed:
+                    CartItem.objects.filter(cart=cart, product_id__in=removed).delete()
+                # Reserve or release what the batch changed
+                hold(cart.id, quantities)
+        except OutOfStock as e:
+            return _out_of_stock(e)
+
+        invalidate_cart(request.user.id)
+        data = get_cart_payload(request.user.id, lambda: serialize_cart(cart_rows(request.user)))
+        return JsonResponse(data)
 
 ####################### Order views ########################################
 
 class OrderCreateView(LoginRequiredMixin, View):
-    @csrf_protect
+    @method_decorator(csrf_protect)
     def post(self, request):
         user = request.user
-        cart = get_object_or_404(Cart, user=user)
-        # Create an order based on the items in the user's cart
-        order = Order.objects.create(user=user)
-        for item in cart.items.all():
-            # Create an order item for each item in the cart
-            OrderItem.objects.create(order=order, product=item.product, quantity=item.quantity)
-        # Clear the user's cart
-        cart.items.all().delete()
-        return JsonResponse({'message': 'Order created successfully'})
+        try:
+            with transaction.atomic():
+                # Lock the cart row so concurrent submits of the same cart run one at a time
+                cart = get_object_or_404(Cart.objects.select_for_update(), user=user)
+                cart_items = list(cart.items.select_related('product'))
+                if not cart_items:
+                    return JsonResponse({'error': 'Cart is empty.'}, status=400)
+
+                # Create an order based on the items in the user's cart, snapshotting prices
+                subtotal = sum(item.product.price * item.quantity for item in cart_items)
+                order = Order.objects.create(user=user, subtotal=subtotal, total=subtotal)
+                order_items = OrderItem.objects.bulk_create([
+                    OrderItem(order=order, product=item.product, quantity=item.quantity, unit_price=item.product.price)
+                    for item in cart_items
+                ])
+
+                # Clear the user's cart in a single statement
+                CartItem.objects.filter(cart=cart).delete()
+
+                # The reserved units become sold; units whose reservation expired are taken from stock again
+                consume_reservations(cart.id, {item.product_id: item.quantity for item in cart_items})
+
+                # Last, so the shared rollup rows stay locked for as short a time as possible
+                record_order_sales(order, order_items)
+        except OutOfStock as e:
+            return _out_of_stock(e)
+        invalidate_cart(user.id)
+        return JsonResponse({'message': 'Order created successfully', 'order_id': order.id})
 
 class OrderDetailView(LoginRequiredMixin, View):
     def get(self, request, order_id):
-        order = get_object_or_404(Order, id=order_id, user=request.user)
-        order_items = order.items.all()
-        data = {
-            'order_id': order.id,
-            'total_price': order.total_price(),
-            'items': [{'product': item.product.name, 'quantity': item.quantity} for item in order_items]
-        }
-        return JsonResponse(data)
+        order = get_object_or_404(user_orders(request.user), id=order_id)
+        return JsonResponse(serialize_order(order))
 
 class OrderHistoryView(LoginRequiredMixin, View):
     def get(self, request):
-        orders = Order.objects.filter(user=request.user)
-        data = []
-        for order in orders:
-            order_items = order.items.all()
-            data.append({
-                'order_id': order.id,
-                'total_price': order.total_price(),
-                'items': [{'product': item.product.name, 'quantity': item.quantity} for item in order_items]
-            })
-        return JsonResponse(data, safe=False)
+        try:
+            since, until = parse_moment(request.GET.get('since'), 'since'), parse_moment(request.GET.get('until'), 'until')
+            cursor, page_size = parse_newest_first_page(request)
+        except (ExportError, PaginationError) as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+        etag, last_modified = _collection_validators(Order.objects.filter(user=request.user), request)
+        response = not_modified(request, etag, last_modified)
+        if response is not None:
+            return response
+
+        orders, next_cursor = paginate_newest_first(user_orders(request.user, since, until), cursor, page_size)
+        data = {'results': [serialize_order(order) for order in orders], 'next_cursor': next_cursor}
+        return set_validators(JsonResponse(data), etag, last_modified)
+
+class OrderExportView(StaffRequiredMixin, View):
+    def get(self, request):
+        fmt = request.GET.get('format', 'csv')
+        compress = bool(request.GET.get('gzip'))
+        try:
+            chunks = export_orders(
+                fmt,
+                since=parse_moment(request.GET.get('since'), 'since'),
+                until=parse_moment(request.GET.get('until'), 'until'),
+                feed=request.GET.get('feed'),
+                compress=compress,
+                chunk_size=settings.STORE_STREAM_CHUNK_SIZE,
+            )
+        except ExportError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+        filename = f'orders.{fmt}.gz' if compress else f'orders.{fmt}'
+        content_type = 'application/gzip' if compress else EXPORT_CONTENT_TYPES[fmt]
+        response = StreamingHttpResponse(chunks, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+####################### Stats views ########################################
+
+class RequestStatsView(StaffRequiredMixin, View):
+    def get(self, request):
+        return JsonResponse(request_stats())
+
+####################### Analytics views ####################################
+
+class SalesAnalyticsView(StaffRequiredMixin, View):
+    def get(self, request):
+        try:
+            params = parse_report_params(request.GET)
+        except AnalyticsError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        return JsonResponse(sales_report(**params))
 
 ####################### Payment views ########################################
 